@@ -0,0 +1,182 @@
+'''
+Batch sources for INVASE training
+
+---------------------------------------------------
+
+BatchSource: draws (x_batch, y_batch) from in-memory arrays into preallocated buffers
+- replace = True: indices sampled with replacement (as np.random.randint in INVASE.train)
+- replace = False: epoch-style sampling without replacement (reshuffled every pass over the data)
+
+PrefetchBatchSource: prepares the next batches in a background thread while the current step runs
+(its batches are drawn ahead of the training, so only BatchSource can be resumed from a checkpoint)
+'''
+#%% Necessary packages
+import threading
+import queue
+
+import numpy as np
+
+#%% Batch source (synchronous)
+class BatchSource():
+
+    '''
+    x: features
+    y: labels
+    batch_size: number of samples per batch
+    replace: sampling with (True) or without (False) replacement
+    seed: seed of the index sampling
+    dtype: floating point type of the batches (None: type of x and y), e.g. INVASE.dtype.
+           The rows are converted while they are copied into the buffers, so x and y are not converted as a whole.
+    '''
+    def __init__(self, x, y, batch_size, replace=True, seed=None, dtype=None):
+
+        self.x = x
+        self.y = y
+        self.n = x.shape[0]
+        self.batch_size = batch_size
+        self.replace = replace
+        self.dtype = dtype
+
+        self.rng = np.random.RandomState(seed)
+
+        # Current permutation (without replacement only)
+        self.perm = None
+        self.pos = self.n
+
+        # Buffers used by next()
+        self.buffer = self.allocate()
+
+    #%% Preallocated batch buffers
+    def allocate(self):
+
+        x_buf = np.empty((self.batch_size,) + self.x.shape[1:], dtype=self.x.dtype if self.dtype is None else self.dtype)
+        y_buf = np.empty((self.batch_size,) + self.y.shape[1:], dtype=self.y.dtype if self.dtype is None else self.dtype)
+
+        return x_buf, y_buf
+
+    #%% Indices of the next batch
+    def next_index(self):
+
+        if self.replace:
+            return self.rng.randint(0, self.n, self.batch_size)
+
+        # Without replacement: walk through a permutation, reshuffle when exhausted
+        idx = np.empty(self.batch_size, dtype=np.int64)
+        filled = 0
+
+        while filled < self.batch_size:
+            if self.pos >= self.n:
+                self.perm = self.rng.permutation(self.n)
+                self.pos = 0
+
+            take = min(self.batch_size - filled, self.n - self.pos)
+            idx[filled:filled+take] = self.perm[self.pos:self.pos+take]
+
+            filled += take
+            self.pos += take
+
+        return idx
+
+    #%% Write the next batch into the given buffers
+    def fill(self, x_buf, y_buf):
+
+        idx = self.next_index()
+
+        np.take(self.x, idx, axis = 0, out = x_buf)
+        np.take(self.y, idx, axis = 0, out = y_buf)
+
+    #%% Next batch (the buffers are reused by the following call)
+    def next(self):
+
+        self.fill(*self.buffer)
+
+        return self.buffer
+
+    #%% Sampling state (to resume a training run from a checkpoint)
+    def get_state(self):
+
+        name, keys, pos, has_gauss, cached_gaussian = self.rng.get_state()
+
+        state = {'keys': keys, 'rng': np.array([pos, has_gauss]), 'cached_gaussian': cached_gaussian, 'pos': self.pos}
+        if self.perm is not None:
+            state['perm'] = self.perm
+
+        return state
+
+    def set_state(self, state):
+
+        pos, has_gauss = state['rng']
+        self.rng.set_state(('MT19937', state['keys'], int(pos), int(has_gauss), float(state['cached_gaussian'])))
+
+        self.pos = int(state['pos'])
+        self.perm = state['perm'] if 'perm' in state else None
+
+    def close(self):
+        pass
+
+
+#%% Batch source with background prefetching
+class PrefetchBatchSource():
+
+    '''
+    source: BatchSource to prefetch from (only used by the background thread)
+    n_prefetch: number of batches prepared ahead of the current one
+    '''
+    def __init__(self, source, n_prefetch=2):
+
+        self.source = source
+
+        # One buffer pair in use by the caller, n_prefetch being filled / ready
+        self.buffers = [source.allocate() for _ in range(n_prefetch + 1)]
+
+        self.free = queue.Queue()
+        self.ready = queue.Queue()
+
+        for i in range(len(self.buffers)):
+            self.free.put(i)
+
+        # Buffer returned by the last next() call
+        self.current = None
+
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    #%% Background filling of the free buffers
+    def worker(self):
+
+        while True:
+            i = self.free.get()
+
+            # Stop signal
+            if i is None:
+                return
+
+            try:
+                self.source.fill(*self.buffers[i])
+            except Exception as e:
+                self.ready.put(e)
+                return
+
+            self.ready.put(i)
+
+    #%% Next batch (valid until the following call)
+    def next(self):
+
+        # Release the previous batch
+        if self.current is not None:
+            self.free.put(self.current)
+            self.current = None
+
+        i = self.ready.get()
+
+        if isinstance(i, Exception):
+            raise i
+
+        self.current = i
+
+        return self.buffers[i]
+
+    def close(self):
+
+        self.free.put(None)
+        self.thread.join()
@@ -0,0 +1,154 @@
+'''
+Training callbacks for INVASE and PVS
+
+---------------------------------------------------
+
+Subclass Callback and override the hooks needed, then pass a list to train(..., callbacks = [...]).
+- on_train_begin(model)
+- on_iteration_end(model, epoch, logs): logs has the losses / accuracies of the iteration and its wall time
+- on_eval(model, epoch, logs): validation metrics, every eval_every iterations (needs validation_data)
+- on_checkpoint(model, epoch, path): after the checkpoint of iteration epoch is written (needs checkpoint_path; INVASE writes it
+  in the background and calls the hook at a later iteration or at the end of the training)
+- on_train_end(model, logs)
+
+Setting model.stop_training = True in a hook ends the training after the current iteration
+(e.g. EarlyStopping). With no callbacks, the training loop does not build the logs at all.
+Callbacks with needs_validation = True (e.g. EarlyStopping) raise a ValueError in train without validation_data.
+'''
+#%% Necessary packages
+import numpy as np
+
+#%% Callback interface
+class Callback():
+
+    # Set to True if the callback relies on on_eval (train then requires validation_data)
+    needs_validation = False
+
+    def on_train_begin(self, model):
+        pass
+
+    def on_iteration_end(self, model, epoch, logs):
+        pass
+
+    def on_eval(self, model, epoch, logs):
+        pass
+
+    def on_checkpoint(self, model, epoch, path):
+        pass
+
+    def on_train_end(self, model, logs):
+        pass
+
+#%% Dispatch to several callbacks
+'''
+has_validation: whether on_eval will be called (validation_data given to train)
+'''
+class CallbackList():
+
+    def __init__(self, callbacks, has_validation=True):
+
+        self.callbacks = list(callbacks)
+
+        for callback in self.callbacks:
+            if callback.needs_validation and not has_validation:
+                raise ValueError(type(callback).__name__ + ' needs validation_data in train (it is only checked in on_eval)')
+
+    def on_train_begin(self, model):
+        for callback in self.callbacks:
+            callback.on_train_begin(model)
+
+    def on_iteration_end(self, model, epoch, logs):
+        for callback in self.callbacks:
+            callback.on_iteration_end(model, epoch, logs)
+
+    def on_eval(self, model, epoch, logs):
+        for callback in self.callbacks:
+            callback.on_eval(model, epoch, logs)
+
+    def on_checkpoint(self, model, epoch, path):
+        for callback in self.callbacks:
+            callback.on_checkpoint(model, epoch, path)
+
+    def on_train_end(self, model, logs):
+        for callback in self.callbacks:
+            callback.on_train_end(model, logs)
+
+#%% Losses and accuracies of an iteration
+def iteration_logs(d_loss, g_loss, v_loss=None, iteration_sec=None):
+
+    logs = {'d_loss': float(d_loss[0]), 'd_acc': float(d_loss[1]), 'g_loss': float(g_loss)}
+
+    if v_loss is not None:
+        logs['v_loss'] = float(v_loss[0])
+        logs['v_acc'] = float(v_loss[1])
+
+    if iteration_sec is not None:
+        logs['iteration_sec'] = iteration_sec
+
+    return logs
+
+#%% Convergence-based early stopping
+'''
+Stops the policy-gradient training when it has plateaued. Needs validation_data (a held-out batch) in train.
+
+At every evaluation, the run is on a plateau if all of these hold since the previous evaluation:
+- the smoothed (exponential moving average) selector loss changed by less than loss_tol
+- the predictor accuracy on the held-out batch did not improve on its best value by more than acc_tol
+- the selection rate on the held-out batch changed by less than sel_tol
+Training stops after patience consecutive plateau evaluations (and not before min_epochs iterations).
+
+smoothing: weight of the past in the moving average of the selector loss
+'''
+class EarlyStopping(Callback):
+
+    needs_validation = True
+
+    def __init__(self, patience=5, loss_tol=1e-3, acc_tol=1e-3, sel_tol=1e-3, smoothing=0.99, min_epochs=1000):
+
+        self.patience = patience
+        self.loss_tol = loss_tol
+        self.acc_tol = acc_tol
+        self.sel_tol = sel_tol
+        self.smoothing = smoothing
+        self.min_epochs = min_epochs
+
+    def on_train_begin(self, model):
+
+        self.smoothed_loss = None
+        self.last_loss = None
+        self.best_acc = -np.inf
+        self.last_sel_rate = None
+        self.wait = 0
+        self.stopped_epoch = None
+
+    def on_iteration_end(self, model, epoch, logs):
+
+        g_loss = logs['g_loss']
+
+        if self.smoothed_loss is None:
+            self.smoothed_loss = g_loss
+        else:
+            self.smoothed_loss = self.smoothing * self.smoothed_loss + (1 - self.smoothing) * g_loss
+
+    def on_eval(self, model, epoch, logs):
+
+        # First evaluation: reference values only
+        if self.last_loss is None:
+            self.last_loss = self.smoothed_loss
+            self.best_acc = logs['d_acc']
+            self.last_sel_rate = logs['sel_rate']
+            return
+
+        plateau = (abs(self.smoothed_loss - self.last_loss) < self.loss_tol and
+                   logs['d_acc'] <= self.best_acc + self.acc_tol and
+                   abs(logs['sel_rate'] - self.last_sel_rate) < self.sel_tol)
+
+        self.last_loss = self.smoothed_loss
+        self.best_acc = max(self.best_acc, logs['d_acc'])
+        self.last_sel_rate = logs['sel_rate']
+
+        self.wait = self.wait + 1 if plateau else 0
+
+        if self.wait >= self.patience and epoch + 1 >= self.min_epochs:
+            self.stopped_epoch = epoch
+            model.stop_training = True
@@ -0,0 +1,121 @@
+'''
+Asynchronous checkpoints of long INVASE training runs
+
+---------------------------------------------------
+
+A checkpoint is a model file of Model_IO (weights, optimizer state, hyper-parameters) with the training state:
+- 'state/epoch': last finished iteration
+- 'state/np_random/*': global NumPy random state (default batch sampling)
+- 'state/batch_source/*': state of the batch source (if it has get_state / set_state, e.g. Batch_Source.BatchSource)
+The in-graph mask sampling of INVASE is keyed by (seed, iteration): the seed is read from the 'config' entry on resume,
+as the learning rates reached by the schedules (as for any saved model).
+
+The values are copied on the training thread (a fast snapshot); writing the file (uncompressed .npz)
+happens in a background thread. Only the last checkpoint is kept (written through a temporary file).
+'''
+#%% Necessary packages
+import queue
+import threading
+
+import numpy as np
+
+from Model_IO import write_arrays
+
+#%% Training state to arrays
+def state_arrays(epoch, batch_source=None):
+
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+
+    arrays = {'state/epoch': np.array(epoch),
+              'state/np_random/keys': keys,
+              'state/np_random/pos': np.array([pos, has_gauss]),
+              'state/np_random/cached_gaussian': np.array(cached_gaussian)}
+
+    if batch_source is not None and hasattr(batch_source, 'get_state'):
+        for key, value in batch_source.get_state().items():
+            arrays['state/batch_source/' + key] = np.asarray(value)
+
+    return arrays
+
+#%% Restore the training state of a checkpoint (returns the last finished iteration)
+def restore_state(path, batch_source=None):
+
+    with np.load(path) as data:
+
+        pos, has_gauss = data['state/np_random/pos']
+        np.random.set_state(('MT19937', data['state/np_random/keys'], int(pos), int(has_gauss),
+                             float(data['state/np_random/cached_gaussian'])))
+
+        if batch_source is not None and hasattr(batch_source, 'set_state'):
+            prefix = 'state/batch_source/'
+            batch_source.set_state({key[len(prefix):]: data[key] for key in data.files if key.startswith(prefix)})
+
+        return int(data['state/epoch'])
+
+#%% Background checkpoint writer
+class AsyncCheckpointer():
+
+    '''
+    path: checkpoint file
+    '''
+    def __init__(self, path):
+
+        self.path = path
+
+        # At most one checkpoint waiting to be written (the training thread waits if the writer falls behind)
+        self.queue = queue.Queue(maxsize=1)
+        self.error = None
+
+        # Tags of the snapshots written since the last call of written()
+        self.done = queue.Queue()
+
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def worker(self):
+
+        while True:
+            item = self.queue.get()
+
+            # Stop signal
+            if item is None:
+                return
+
+            arrays, tag = item
+
+            try:
+                write_arrays(self.path, arrays)
+            except Exception as e:
+                self.error = e
+            else:
+                self.done.put(tag)
+
+    #%% Queue a snapshot (dict of arrays) to be written, tag: returned by written() once the file is written
+    def submit(self, arrays, tag=None):
+
+        if self.error is not None:
+            raise self.error
+
+        self.queue.put((arrays, tag))
+
+    #%% Tags of the snapshots written since the last call (polled by the training thread)
+    def written(self):
+
+        tags = []
+        while True:
+            try:
+                tags.append(self.done.get_nowait())
+            except queue.Empty:
+                return tags
+
+    #%% Wait for the pending checkpoint and stop the writer
+    '''
+    raise_error: raise a write error (False when the training already failed, so that its own exception is kept)
+    '''
+    def close(self, raise_error=True):
+
+        self.queue.put(None)
+        self.thread.join()
+
+        if self.error is not None and raise_error:
+            raise self.error
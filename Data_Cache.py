@@ -0,0 +1,102 @@
+'''
+On-disk cache of the synthetic datasets
+
+---------------------------------------------------
+
+Each dataset (X, Y_Out, Ground_Truth) of generate_data is written once to .npy files
+in a directory named by a hash of the generation parameters (data_type, n, seed, out, dtype).
+Later calls reopen the files as read-only memory maps instead of regenerating the data.
+
+The cache is bounded by max_bytes: the least recently used datasets are removed first.
+'''
+#%% Necessary packages
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+
+from Data_Generation import generate_data
+
+# Bump when the generation changes, so stale datasets are not reused
+CACHE_VERSION = 2
+
+# Files of a cached dataset
+NAMES = ['X', 'Y', 'Ground_Truth']
+
+#%% Content key of the generation parameters
+def cache_key(n, data_type, seed, out, dtype = np.float64):
+
+    params = {'n': int(n), 'data_type': data_type, 'seed': int(seed), 'out': out, 'dtype': np.dtype(dtype).name, 'version': CACHE_VERSION}
+
+    return hashlib.sha1(json.dumps(params, sort_keys = True).encode()).hexdigest()
+
+#%% Load (or generate and store) a dataset
+'''
+n: Number of samples
+data_type: Syn1 to Syn6
+seed: Seed of the dataset
+out: Y or Prob
+cache_dir: Directory of the cache
+max_bytes: Disk budget of the cache (None: unbounded)
+dtype: Floating point type of the dataset
+
+Returns X, Y_Out, Ground_Truth as read-only memory maps
+'''
+
+def load_data(n=10000, data_type='Syn1', seed = 0, out = 'Y', cache_dir = 'data_cache', max_bytes = None, dtype = np.float64):
+
+    path = os.path.join(cache_dir, cache_key(n, data_type, seed, out, dtype))
+
+    if not os.path.isdir(path):
+
+        X, Y_Out, Ground_Truth = generate_data(n = n, data_type = data_type, seed = seed, out = out, dtype = dtype)
+
+        # Write into a temporary directory and rename, so readers never see a partial dataset
+        tmp_path = path + '.tmp' + str(os.getpid())
+        os.makedirs(tmp_path, exist_ok = True)
+
+        for name, array in zip(NAMES, [X, Y_Out, Ground_Truth]):
+            np.save(os.path.join(tmp_path, name + '.npy'), array)
+
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Already stored by another process
+            shutil.rmtree(tmp_path, ignore_errors = True)
+
+        if max_bytes is not None:
+            evict(cache_dir, max_bytes, keep = path)
+
+    # Mark as recently used
+    os.utime(path)
+
+    return tuple(np.load(os.path.join(path, name + '.npy'), mmap_mode = 'r') for name in NAMES)
+
+#%% Size of a cached dataset
+def entry_size(path):
+
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+#%% Remove the least recently used datasets until the cache fits in max_bytes
+def evict(cache_dir, max_bytes, keep = None):
+
+    entries = [os.path.join(cache_dir, f) for f in os.listdir(cache_dir) if '.tmp' not in f]
+    entries = [e for e in entries if os.path.isdir(e)]
+
+    # Oldest first
+    entries.sort(key = os.path.getmtime)
+
+    total = sum(entry_size(e) for e in entries)
+
+    for e in entries:
+
+        if total <= max_bytes:
+            break
+
+        if keep is not None and os.path.abspath(e) == os.path.abspath(keep):
+            continue
+
+        total -= entry_size(e)
+        shutil.rmtree(e, ignore_errors = True)
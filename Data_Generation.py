@@ -22,105 +22,144 @@ Y = 1/(1+logit)
 - Syn4: If X11 < 0, Syn2, X11 >= Syn3
 '''
 #%% Necessary packages
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
 import numpy as np 
 
+# Rows per counter block of the random-access generation (fixed: changing it changes the datasets)
+ROW_BLOCK = 4096
+
 #%% X Generation
-def generate_X (n=10000):
+'''
+rng: random generator (np.random.RandomState / Generator). None uses the global np.random state
+dtype: Floating point type of X (labels and dense ground truth follow the type of X)
+'''
+def generate_X (n=10000, rng=None, dtype=np.float64):
+    
+    rng = np.random if rng is None else rng
     
-    X = np.random.randn(n, 11)
+    X = rng.standard_normal((n, 11)).astype(dtype, copy = False)
     
     return X
 
-#%% Basic Label Generation (Syn1, Syn2, Syn3)
+#%% Logit of the basic rules (Syn1, Syn2, Syn3)
 '''
-X: Features
-data_type: Syn1, Syn2, Syn3
+rows: optional boolean mask of the rows (only these rows and the columns of the rule are copied)
+Always computed in float64, whatever the type of X (exp overflows above ~88 in float32)
 '''
-def Basic_Label_Generation(X, data_type):
+Basic_Columns = {'Syn1': slice(0,2), 'Syn2': slice(2,6), 'Syn3': slice(6,10)}
+
+def Basic_Logit(X, data_type, rows=None):
     
-    # number of samples
-    n = len(X[:,0])
+    # Columns used by the rule
+    columns = Basic_Columns[data_type]
+    X = X[:,columns] if rows is None else X[rows,columns]
+    X = X.astype(np.float64, copy = False)
     
-    # Logit computation
     # 1. Syn1
     if (data_type == 'Syn1'):
         logit = np.exp(X[:,0]*X[:,1])
         
     # 2. Syn2
     elif (data_type == 'Syn2'):       
-        logit = np.exp(np.sum(X[:,2:6]**2, axis = 1) - 4.0) 
+        logit = np.exp(np.sum(X**2, axis = 1) - 4.0) 
         
     # 3. Syn3
     elif (data_type == 'Syn3'):
-        logit = np.exp(-10 * np.sin(0.2*X[:,6]) + abs(X[:,7]) + X[:,8] + np.exp(-X[:,9])  - 2.4) 
+        logit = np.exp(-10 * np.sin(0.2*X[:,0]) + abs(X[:,1]) + X[:,2] + np.exp(-X[:,3])  - 2.4) 
+        
+    return logit
+
+# Basic rules combined by the complex datasets (X11 < 0, X11 >= 0)
+Complex_Rules = {'Syn4': ('Syn1','Syn2'), 'Syn5': ('Syn1','Syn3'), 'Syn6': ('Syn2','Syn3')}
+
+#%% Basic Label Generation (Syn1, Syn2, Syn3)
+'''
+X: Features
+data_type: Syn1, Syn2, Syn3
+rng: random generator. None uses the global np.random state
+'''
+def Basic_Label_Generation(X, data_type, rng=None):
+    
+    rng = np.random if rng is None else rng
+    
+    # number of samples
+    n = len(X[:,0])
+    
+    # Logit computation
+    logit = Basic_Logit(X, data_type)
         
     # P(Y=1|X) & P(Y=0|X)
     prob_1 = np.reshape( (1 / (1+logit)), [n,1])
     prob_0 = np.reshape( (logit / (1+logit)), [n,1])
     
-    # Probability output
-    prob_y = np.concatenate((prob_0,prob_1), axis = 1)
+    # Probability output (in the type of X, the sampling uses the float64 probabilities)
+    prob_y = np.concatenate((prob_0,prob_1), axis = 1).astype(X.dtype, copy = False)
     
     # Sampling from the probability
-    y = np.zeros([n,2])
-    y[:,0] = np.reshape(np.random.binomial(1, prob_0), [n,])
+    y = np.zeros([n,2], dtype = X.dtype)
+    y[:,0] = np.reshape(rng.binomial(1, prob_0), [n,])
     y[:,1] = 1-y[:,0]
 
     return y, prob_y
     
 #%% Complex Label Generation (Syn4, Syn5, Syn6)
 
-def Complex_Label_Generation(X, data_type):
+def Complex_Label_Generation(X, data_type, rng=None):
+    
+    rng = np.random if rng is None else rng
     
     # number of samples
     n = len(X[:,0])
     
-    # Logit generation
-    # 1. Syn4
-    if (data_type == 'Syn4'):
-        logit1 = np.exp(X[:,0]*X[:,1])
-        logit2 = np.exp(np.sum(X[:,2:6]**2, axis = 1) - 4.0) 
+    # Based on X[:,10], compute each logit only on the rows where it is used
+    # Syn4: (Syn1, Syn2), Syn5: (Syn1, Syn3), Syn6: (Syn2, Syn3)
+    rule1, rule2 = Complex_Rules[data_type]
     
-    # 2. Syn5
-    elif (data_type == 'Syn5'):
-        logit1 = np.exp(X[:,0]*X[:,1])
-        logit2 = np.exp(-10 * np.sin(0.2*X[:,6]) + abs(X[:,7]) + X[:,8] + np.exp(-X[:,9])  - 2.4) 
+    idx1 = X[:,10]< 0
+    idx2 = ~idx1
     
-    # 3. Syn6
-    elif (data_type == 'Syn6'):
-        logit1 = np.exp(np.sum(X[:,2:6]**2, axis = 1) - 4.0) 
-        logit2 = np.exp(-10 * np.sin(0.2*X[:,6]) + abs(X[:,7]) + X[:,8] + np.exp(-X[:,9])  - 2.4) 
-
-    # Based on X[:,10], combine two logits        
-    idx1 = (X[:,10]< 0)*1
-    idx2 = (X[:,10]>=0)*1
-    
-    logit = logit1 * idx1 + logit2 * idx2
+    logit = np.empty(n, dtype = np.float64)
+    logit[idx1] = Basic_Logit(X, rule1, rows = idx1)
+    logit[idx2] = Basic_Logit(X, rule2, rows = idx2)
         
     # P(Y=1|X) & P(Y=0|X)
     prob_1 = np.reshape( (1 / (1+logit)), [n,1])
     prob_0 = np.reshape( (logit / (1+logit)), [n,1])
     
-    # Probability output
-    prob_y = np.concatenate((prob_0,prob_1), axis = 1)
+    # Probability output (in the type of X, the sampling uses the float64 probabilities)
+    prob_y = np.concatenate((prob_0,prob_1), axis = 1).astype(X.dtype, copy = False)
     
     # Sampling from the probability
-    y = np.zeros([n,2])
-    y[:,0] = np.reshape(np.random.binomial(1, prob_0), [n,])
+    y = np.zeros([n,2], dtype = X.dtype)
+    y[:,0] = np.reshape(rng.binomial(1, prob_0), [n,])
     y[:,1] = 1-y[:,0]
 
     return y, prob_y
 
 #%% Ground truth Variable Importance
+'''
+X: Features
+data_type: Syn1 to Syn6
+form: Representation of the ground truth
+- 'dense': 0/1 array of the type of X (n x d)
+- 'bool': boolean array (n x d)
+- 'packed': bits packed along the features with np.packbits (uint8, n x ceil(d/8))
+'''
 
-def Ground_Truth_Generation(X, data_type):
+def Ground_Truth_Generation(X, data_type, form = 'dense'):
+
+    if form not in ['dense', 'bool', 'packed']:
+        raise ValueError('form should be dense, bool or packed: ' + str(form))
 
     # Number of samples and features
     n = len(X[:,0])
     d = len(X[0,:])
 
     # Output initialization
-    out = np.zeros([n,d])
+    out = np.zeros([n,d], dtype = X.dtype if form == 'dense' else bool)
     
     # Index
     if (data_type in ['Syn4','Syn5','Syn6']):        
@@ -148,6 +187,9 @@ def Ground_Truth_Generation(X, data_type):
         out[idx1,2:6] = 1
         out[idx2,6:10] = 1
         
+    if form == 'packed':
+        out = np.packbits(out, axis = 1)
+        
     return out
 
     
@@ -156,22 +198,37 @@ def Ground_Truth_Generation(X, data_type):
 n: Number of samples
 data_type: Syn1 to Syn6
 out: Y or Prob_Y
+n_jobs: Number of worker processes (None or 1: single process with the global np.random state)
+out_dir: With n_jobs > 1, directory of .npy memmap outputs (None: shared memory, copied to the returned arrays)
+ground_truth: Representation of the ground truth (dense, bool or packed, see Ground_Truth_Generation)
+dtype: Floating point type of X, Y and the dense ground truth (e.g. np.float32)
 '''    
     
-def generate_data(n=10000, data_type='Syn1', seed = 0, out = 'Y'):
+def generate_data(n=10000, data_type='Syn1', seed = 0, out = 'Y', n_jobs = None, out_dir = None, ground_truth = 'dense', dtype = np.float64):
+
+    # Process-parallel generation
+    if n_jobs is not None and n_jobs > 1:
+        if ground_truth != 'dense':
+            raise ValueError('Process-parallel generation only supports the dense ground truth')
+        return generate_data_parallel(n, data_type, seed, out, n_jobs, out_dir, dtype)
 
     # For same seed
     np.random.seed(seed)
 
+    return generate_rows(n, data_type, out, ground_truth = ground_truth, dtype = dtype)
+
+#%% Generate X, Y and ground truth with a given random generator
+def generate_rows(n, data_type, out = 'Y', rng = None, ground_truth = 'dense', dtype = np.float64):
+
     # X generation
-    X = generate_X(n)
+    X = generate_X(n, rng, dtype)
 
     # Y generation
     if (data_type in ['Syn1','Syn2','Syn3']):
-        Y, Prob_Y = Basic_Label_Generation(X, data_type)
+        Y, Prob_Y = Basic_Label_Generation(X, data_type, rng)
         
     elif (data_type in ['Syn4','Syn5','Syn6']):
-        Y, Prob_Y = Complex_Label_Generation(X, data_type)
+        Y, Prob_Y = Complex_Label_Generation(X, data_type, rng)
     
     # Output
     if out == 'Prob':
@@ -180,7 +237,147 @@ def generate_data(n=10000, data_type='Syn1', seed = 0, out = 'Y'):
         Y_Out = Y
         
     # Ground truth
-    Ground_Truth = Ground_Truth_Generation(X, data_type)
+    Ground_Truth = Ground_Truth_Generation(X, data_type, ground_truth)
         
     return X, Y_Out, Ground_Truth
+
+
+#%% Generate X and Y in chunks
+'''
+n: Number of samples
+data_type: Syn1 to Syn6
+seed: Seed of the dataset. Chunk k uses its own generator seeded by (seed, k)
+out: Y or Prob_Y
+chunk_size: Number of samples per chunk (the last chunk may be smaller)
+ground_truth: Representation of the ground truth (dense, bool or packed)
+dtype: Floating point type of X, Y and the dense ground truth
+
+Yields (X, Y_Out, Ground_Truth) for each chunk. 
+The rows follow the same distribution as generate_data, and each chunk can be regenerated on its own.
+'''
+
+def generate_data_chunks(n=10000, data_type='Syn1', seed = 0, out = 'Y', chunk_size = 100000, ground_truth = 'dense', dtype = np.float64):
+    
+    for k, start in enumerate(range(0, n, chunk_size)):
+        
+        # Deterministic generator of the chunk
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key = (k,)))
+        
+        yield generate_rows(min(chunk_size, n - start), data_type, out, rng, ground_truth, dtype)
+
+
+#%% Random-access (counter-based) generation
+'''
+start, stop: Row range [start, stop) of the dataset
+data_type: Syn1 to Syn6
+seed: Seed of the dataset (Philox key)
+out: Y or Prob_Y
+ground_truth: Representation of the ground truth (dense, bool or packed)
+dtype: Floating point type of X, Y and the dense ground truth
+
+Rows are generated in blocks of ROW_BLOCK rows. Block b is drawn from a Philox stream with key = seed 
+and the block index in the high word of the counter, so any row range can be produced independently 
+(e.g. by different processes) and matches the same rows of any other range bit-for-bit.
+'''
+
+def generate_data_range(start, stop, data_type='Syn1', seed = 0, out = 'Y', ground_truth = 'dense', dtype = np.float64):
     
+    if not (0 <= start < stop):
+        raise ValueError('Invalid row range: [' + str(start) + ', ' + str(stop) + ')')
+    
+    X_Out, Y_Out, G_Out = [], [], []
+    
+    for b in range(start // ROW_BLOCK, (stop - 1) // ROW_BLOCK + 1):
+        
+        # Counter-based generator of the block
+        rng = np.random.Generator(np.random.Philox(key = seed, counter = [0, 0, 0, b]))
+        X, Y, Ground_Truth = generate_rows(ROW_BLOCK, data_type, out, rng, ground_truth, dtype)
+        
+        # Rows of the block inside the range
+        lo = max(start, b * ROW_BLOCK) - b * ROW_BLOCK
+        hi = min(stop, (b+1) * ROW_BLOCK) - b * ROW_BLOCK
+        
+        X_Out.append(X[lo:hi])
+        Y_Out.append(Y[lo:hi])
+        G_Out.append(Ground_Truth[lo:hi])
+        
+    return np.concatenate(X_Out), np.concatenate(Y_Out), np.concatenate(G_Out)
+
+
+#%% Process-parallel generation
+'''
+n: Number of samples
+data_type: Syn1 to Syn6
+seed: Seed of the dataset
+out: Y or Prob_Y
+n_jobs: Number of worker processes
+out_dir: Directory of the X.npy, Y.npy and Ground_Truth.npy memmap outputs (None: shared memory)
+dtype: Floating point type of the outputs
+
+The rows are split into n_jobs contiguous parts. Part k is generated with the k-th child of 
+np.random.SeedSequence(seed), so the output is reproducible for a fixed (seed, n_jobs) 
+(and differs between different n_jobs). Use generate_data_range for output independent of n_jobs.
+'''
+
+def generate_data_parallel(n=10000, data_type='Syn1', seed = 0, out = 'Y', n_jobs = 2, out_dir = None, dtype = np.float64):
+    
+    shapes = [(n, 11), (n, 2), (n, 11)]
+    names = ['X', 'Y', 'Ground_Truth']
+    dtype = np.dtype(dtype)
+    
+    # Output targets shared by the workers
+    handles = []
+    if out_dir is None:
+        handles = [shared_memory.SharedMemory(create = True, size = dtype.itemsize * int(np.prod(shape))) for shape in shapes]
+        targets = [('shm', handle.name, shape) for handle, shape in zip(handles, shapes)]
+    else:
+        os.makedirs(out_dir, exist_ok = True)
+        targets = [('npy', os.path.join(out_dir, name + '.npy'), shape) for name, shape in zip(names, shapes)]
+        for target in targets:
+            np.lib.format.open_memmap(target[1], mode = 'w+', dtype = dtype, shape = target[2]).flush()
+    
+    try:
+        # Contiguous row parts with independent seeds
+        bounds = np.linspace(0, n, n_jobs + 1).astype(int)
+        children = np.random.SeedSequence(seed).spawn(n_jobs)
+        
+        jobs = [(data_type, out, children[k], bounds[k], bounds[k+1], targets, dtype) for k in range(n_jobs)]
+        
+        with ProcessPoolExecutor(max_workers = n_jobs) as executor:
+            list(executor.map(_generate_part, jobs))
+        
+        # Outputs
+        if out_dir is None:
+            return tuple(np.ndarray(shape, dtype = dtype, buffer = handle.buf).copy() for handle, shape in zip(handles, shapes))
+        
+        return tuple(np.load(target[1], mmap_mode = 'r+') for target in targets)
+        
+    finally:
+        for handle in handles:
+            handle.close()
+            handle.unlink()
+
+#%% Worker of the process-parallel generation (writes rows [start, stop) into the targets)
+def _generate_part(job):
+    
+    data_type, out, seed_seq, start, stop, targets, dtype = job
+    
+    if stop <= start:
+        return
+    
+    rng = np.random.default_rng(seed_seq)
+    outputs = generate_rows(stop - start, data_type, out, rng, dtype = dtype)
+    
+    for output, (kind, location, shape) in zip(outputs, targets):
+        
+        if kind == 'shm':
+            handle = shared_memory.SharedMemory(name = location)
+            view = np.ndarray(shape, dtype = dtype, buffer = handle.buf)
+            view[start:stop] = output
+            del view
+            handle.close()
+        else:
+            view = np.load(location, mmap_mode = 'r+')
+            view[start:stop] = output
+            view.flush()
+            del view
@@ -0,0 +1,80 @@
+'''
+Multi-seed evaluation of the prediction performance (AUROC, AUPRC, accuracy)
+
+---------------------------------------------------
+
+The test sets of all seeds are generated in parallel worker processes
+(or loaded from the Data_Cache directory, where the workers store the missing ones).
+The trained model stays in the calling process (Keras models cannot be shared across processes):
+it is run once over the stacked test sets, and the scores of all seeds are computed at once 
+on the (seeds x n) arrays with Performance_Metrics.batched_prediction_metrics.
+
+Predict_Out[i, metric, network]
+- metric: 0 AUROC, 1 AUPRC, 2 accuracy
+- network: 0 baseline (all features), 1 predictor (selected features)
+'''
+#%% Necessary packages
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Data_Generation import generate_data
+from Data_Cache import load_data, evict
+from Performance_Metrics import batched_prediction_metrics
+
+#%% Test set of one seed (worker)
+def _generate_test_set(job):
+
+    n, data_type, data_out, seed, dtype, cache_dir = job
+
+    # Cached: store it (if missing), the calling process maps it from the cache
+    if cache_dir is not None:
+        load_data(n = n, data_type = data_type, seed = seed, out = data_out, cache_dir = cache_dir, dtype = dtype)
+        return None
+
+    x_test, y_test, _ = generate_data(n = n, data_type = data_type, seed = seed, out = data_out, dtype = dtype)
+
+    return x_test, y_test
+
+#%% Evaluation over several test seeds
+'''
+model: trained model with inference(x) returning (sel_prob, val_predict, dis_predict) (e.g. INVASE)
+data_type: Syn1 to Syn6
+data_out: Y or Prob
+n: Number of samples per test set
+seeds: Seeds of the test sets
+n_jobs: Number of worker processes (None: number of CPUs), started with spawn (call from an if __name__ == '__main__' block)
+dtype: Floating point type of the test sets
+cache_dir: Data_Cache directory of the test sets (None: generated without cache)
+max_bytes: disk budget of the cache (see Data_Cache.load_data)
+
+Returns Predict_Out (len(seeds) x 3 x 2)
+'''
+
+def evaluate_seeds(model, data_type, data_out, n, seeds, n_jobs = None, dtype = np.float64, cache_dir = None, max_bytes = None):
+
+    # 1. Test sets of all seeds
+    # (spawned workers: forking the process of a trained model, with its TensorFlow threads, can deadlock)
+    with ProcessPoolExecutor(max_workers = n_jobs, mp_context = multiprocessing.get_context('spawn')) as executor:
+        test_sets = list(executor.map(_generate_test_set, [(n, data_type, data_out, seed, dtype, cache_dir) for seed in seeds]))
+
+    if cache_dir is not None:
+        test_sets = [load_data(n = n, data_type = data_type, seed = seed, out = data_out, cache_dir = cache_dir, dtype = dtype)[0:2] for seed in seeds]
+
+    x_all = np.concatenate([x_test for x_test, _ in test_sets])
+    y_all = np.stack([y_test[:,1] for _, y_test in test_sets])
+
+    # Disk budget of the cache (the test sets just used are the most recent, so evicted last)
+    if cache_dir is not None and max_bytes is not None:
+        evict(cache_dir, max_bytes)
+
+    # 2. Selection probability and predictions over all the test sets at once
+    _, val_predict, dis_predict = model.inference(x_all)
+
+    # 3. Scores of all seeds (seeds x n arrays)
+    Predict_Out = np.zeros([len(seeds),3,2])
+    Predict_Out[:,:,0] = batched_prediction_metrics(y_all, np.reshape(val_predict[:,1], [len(seeds), n]))
+    Predict_Out[:,:,1] = batched_prediction_metrics(y_all, np.reshape(dis_predict[:,1], [len(seeds), n]))
+
+    return Predict_Out
@@ -0,0 +1,233 @@
+'''
+Local micro-batching explanation server for a trained INVASE model
+
+---------------------------------------------------
+
+Concurrent requests are queued and coalesced into micro-batches: a batch is run as soon as it
+reaches max_batch_size rows or its first request has waited max_latency seconds.
+Only the batching thread calls the model.
+
+HTTP API (TCP or Unix socket, no external services):
+- POST /explain  {"x": [[...], ...]}  ->  {"sel_prob": [...], "val_prediction": [...], "dis_prediction": [...]}
+                 (x: one or more rows of model.input_shape features, otherwise 400)
+- GET  /stats    ->  throughput / latency counters
+
+Usage:
+    server = make_server(INVASE_Alg, port = 8000)          # or unix_socket = '/tmp/invase.sock'
+    server.serve_forever()
+'''
+#%% Necessary packages
+import os
+import json
+import time
+import queue
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+#%% Pending request
+class Request():
+
+    def __init__(self, x):
+
+        self.x = x
+        self.arrival = time.time()
+        self.done = threading.Event()
+
+        self.result = None
+        self.error = None
+
+#%% Micro-batching of the requests
+class MicroBatcher():
+
+    '''
+    model: trained model with inference(x) returning (sel_prob, val_prediction, dis_prediction) (e.g. INVASE)
+    max_batch_size: maximum number of rows per model call
+    max_latency: maximum waiting time (seconds) of a request before its batch is run
+    '''
+    def __init__(self, model, max_batch_size=1000, max_latency=0.005):
+
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self.queue = queue.Queue()
+
+        # Counters
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.n_requests = 0
+        self.n_rows = 0
+        self.n_batches = 0
+        self.total_latency = 0.
+        self.max_observed_latency = 0.
+
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    #%% Explanation of x (blocks until its batch is run)
+    def explain(self, x):
+
+        request = Request(x)
+        self.queue.put(request)
+        request.done.wait()
+
+        if request.error is not None:
+            raise request.error
+
+        return request.result
+
+    #%% Batching thread
+    def worker(self):
+
+        while True:
+            batch = [self.queue.get()]
+            rows = len(batch[0].x)
+            deadline = batch[0].arrival + self.max_latency
+
+            # Collect requests until the batch is full or the first request is due
+            while rows < self.max_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                rows += len(request.x)
+
+            self.run(batch)
+
+    #%% Run one micro-batch and split the outputs back to the requests
+    def run(self, batch):
+
+        try:
+            x = np.concatenate([request.x for request in batch])
+            sel_prob, val_prediction, dis_prediction = self.model.inference(x)
+        except Exception as e:
+            for request in batch:
+                request.error = e
+                request.done.set()
+            return
+
+        now = time.time()
+        start = 0
+
+        for request in batch:
+            stop = start + len(request.x)
+            request.result = (sel_prob[start:stop], val_prediction[start:stop], dis_prediction[start:stop])
+            start = stop
+
+        # Counters
+        with self.lock:
+            self.n_batches += 1
+            self.n_requests += len(batch)
+            self.n_rows += len(x)
+            for request in batch:
+                latency = now - request.arrival
+                self.total_latency += latency
+                self.max_observed_latency = max(self.max_observed_latency, latency)
+
+        for request in batch:
+            request.done.set()
+
+    #%% Throughput / latency counters
+    def stats(self):
+
+        with self.lock:
+            elapsed = time.time() - self.start_time
+
+            return {'requests': self.n_requests,
+                    'rows': self.n_rows,
+                    'batches': self.n_batches,
+                    'mean_batch_rows': self.n_rows / max(self.n_batches, 1),
+                    'requests_per_sec': self.n_requests / elapsed,
+                    'rows_per_sec': self.n_rows / elapsed,
+                    'mean_latency_ms': 1000 * self.total_latency / max(self.n_requests, 1),
+                    'max_latency_ms': 1000 * self.max_observed_latency}
+
+#%% HTTP handler
+class ExplanationHandler(BaseHTTPRequestHandler):
+
+    # Set by make_server
+    batcher = None
+
+    def send_json(self, code, body):
+
+        data = json.dumps(body).encode()
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+
+        if self.path == '/stats':
+            self.send_json(200, self.batcher.stats())
+        else:
+            self.send_json(404, {'error': 'unknown path'})
+
+    def do_POST(self):
+
+        if self.path != '/explain':
+            self.send_json(404, {'error': 'unknown path'})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            x = np.atleast_2d(np.asarray(body['x'], dtype=np.float32))
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+
+        # Checked before queuing: a malformed request would fail the whole micro-batch it joins
+        d = self.batcher.model.input_shape
+        if x.ndim != 2 or x.shape[0] == 0 or x.shape[1] != d:
+            self.send_json(400, {'error': 'x should be a non-empty list of rows of ' + str(d) + ' features: shape ' + str(x.shape)})
+            return
+
+        try:
+            sel_prob, val_prediction, dis_prediction = self.batcher.explain(x)
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+            return
+
+        self.send_json(200, {'sel_prob': sel_prob.tolist(),
+                             'val_prediction': val_prediction.tolist(),
+                             'dis_prediction': dis_prediction.tolist()})
+
+    # Unix sockets have no client address
+    def address_string(self):
+        return str(self.client_address[0]) if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+#%% Server
+'''
+model: trained model with inference(x) (e.g. INVASE)
+host, port: TCP address (used if unix_socket is None)
+unix_socket: path of a Unix socket
+max_batch_size, max_latency: micro-batching parameters (see MicroBatcher)
+'''
+
+def make_server(model, host='127.0.0.1', port=8000, unix_socket=None, max_batch_size=1000, max_latency=0.005):
+
+    handler = type('Handler', (ExplanationHandler,), {'batcher': MicroBatcher(model, max_batch_size, max_latency)})
+
+    if unix_socket is None:
+        return ThreadingHTTPServer((host, port), handler)
+
+    if os.path.exists(unix_socket):
+        os.remove(unix_socket)
+
+    return ThreadingUnixHTTPServer(unix_socket, handler)
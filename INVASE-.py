@@ -12,18 +12,33 @@ Instance-wise Variable Selection (INVASE) - without baseline networks
 '''
 
 #%% Necessary packages
-# 1. Keras
-from keras.layers import Input, Dense, Multiply
-from keras.layers import BatchNormalization
-from keras.models import Sequential, Model
-from keras.optimizers import Adam
-from keras import regularizers
-from keras import backend as K
+import time
+
+# 1. Keras and TensorFlow (imported on the first model construction, see load_backend)
+Input = Dense = Multiply = BatchNormalization = None
+Sequential = Model = Adam = regularizers = K = tf = None
 
 # 2. Others
-import tensorflow as tf
 import numpy as np
 
+#%% Lazy import of Keras and TensorFlow
+def load_backend():
+    
+    global Input, Dense, Multiply, BatchNormalization, Sequential, Model, Adam, regularizers, K, tf
+    
+    # Already imported
+    if K is not None:
+        return
+    
+    from keras.layers import Input, Dense, Multiply
+    from keras.layers import BatchNormalization
+    from keras.models import Sequential, Model
+    from keras.optimizers import Adam
+    from keras import regularizers
+    from keras import backend as K
+    
+    import tensorflow as tf
+
 #%% Define PVS class
 class PVS():
     
@@ -31,13 +46,21 @@ class PVS():
     '''
     x_train: training samples
     data_type: Syn1 to Syn 6
+    n_epoch: maximum number of iterations (see Callbacks.EarlyStopping to stop earlier)
     '''
-    def __init__(self, x_train, data_type, lamda):
+    def __init__(self, x_train, data_type, lamda, n_epoch=10000):
+        
+        # Import Keras and TensorFlow
+        load_backend()
+        
+        # Constructor argument (to rebuild the model in load)
+        self.data_type = data_type
+        
         self.latent_dim1 = 100      # Dimension of actor (generator) network
         self.latent_dim2 = 200      # Dimension of critic (discriminator) network
         
         self.batch_size = 1000      # Batch size
-        self.epochs = 10000         # Epoch size (large epoch is needed due to the policy gradient framework)
+        self.epochs = n_epoch       # Epoch size (large epoch is needed due to the policy gradient framework)
         self.lamda = lamda            # Hyper-parameter for the number of selected features
 
         self.input_shape = x_train.shape[1]     # Input dimension
@@ -57,6 +80,14 @@ class PVS():
         self.generator = self.build_generator()
         # Use custom loss (my loss)
         self.generator.compile(loss=self.my_loss, optimizer=optimizer)
+        
+        # Optimizer state variables of each network (saved with the model)
+        self.optimizer_weights = {}
+        
+        # Build the Keras training functions now, so that their optimizer state exists before any load
+        for name, model in [('discriminator', self.discriminator), ('generator', self.generator)]:
+            model._make_train_function()
+            self.optimizer_weights[name] = list(model.optimizer.weights)
 
     #%% Custom loss definition
     def my_loss(self, y_true, y_pred):
@@ -137,10 +168,31 @@ class PVS():
         return samples
 
     #%% Training procedure
-    def train(self, x_train, y_train):
+    '''
+    callbacks: optional list of Callbacks.Callback
+    validation_data: (x_val, y_val) evaluated every eval_every iterations and passed to on_eval
+    checkpoint_path: file saved (see save) every checkpoint_every iterations, then passed to on_checkpoint
+    '''
+    def train(self, x_train, y_train, callbacks=None, validation_data=None, eval_every=100, 
+              checkpoint_path=None, checkpoint_every=1000):
+        
+        # Callbacks (nothing is built or called per iteration without callbacks)
+        if callbacks:
+            from Callbacks import CallbackList, iteration_logs
+            callbacks = CallbackList(callbacks, has_validation = validation_data is not None)
+            callbacks.on_train_begin(self)
+        else:
+            callbacks = None
+        
+        self.stop_training = False
+        t_start = None
+        epoch = -1
 
         # For each epoch (actually iterations)
         for epoch in range(self.epochs):
+            
+            if callbacks is not None:
+                t_start = time.perf_counter()
 
             #%% Train Discriminator
             # Select a random batch of samples
@@ -172,6 +224,39 @@ class PVS():
  
             if epoch % 100 == 0:              
                 print(dialog)
+            
+            #%% Callbacks, periodic validation and checkpoints
+            if callbacks is not None:
+                
+                callbacks.on_iteration_end(self, epoch, iteration_logs(d_loss, g_loss, iteration_sec = time.perf_counter() - t_start))
+                
+                if validation_data is not None and (epoch + 1) % eval_every == 0:
+                    callbacks.on_eval(self, epoch, self.evaluate(*validation_data))
+            
+            if checkpoint_path is not None and (epoch + 1) % checkpoint_every == 0:
+                
+                self.save(checkpoint_path)
+                
+                if callbacks is not None:
+                    callbacks.on_checkpoint(self, epoch, checkpoint_path)
+            
+            # Stop requested by a callback
+            if self.stop_training:
+                break
+            
+        if callbacks is not None:
+            callbacks.on_train_end(self, {'epochs': epoch + 1})
+    
+    #%% Validation metrics (accuracy of the discriminator on the selected features and selection rate)
+    def evaluate(self, x, y):
+        
+        gen_prob = self.output(x)
+        score = 1.*(gen_prob > 0.5)
+        
+        dis_prediction = self.discriminator.predict([x, score])
+        
+        return {'d_acc': float(np.mean(np.argmax(dis_prediction, axis = 1) == np.argmax(y, axis = 1))),
+                'sel_rate': float(np.mean(score))}
     
     #%% Selected Features        
     def output(self, x_train):
@@ -179,6 +264,33 @@ class PVS():
         gen_prob = self.generator.predict(x_train)
         
         return np.asarray(gen_prob)
+    
+    #%% Save the trained model (weights, optimizer state and hyper-parameters) in a single file
+    def save(self, path):
+        
+        from Model_IO import save_model
+        
+        config = {'data_type': self.data_type, 'lamda': self.lamda, 'n_epoch': self.epochs, 'input_shape': self.input_shape, 'activation': self.activation}
+        
+        networks = {'discriminator': self.discriminator, 'generator': self.generator}
+        
+        save_model(path, config, networks, self.optimizer_weights)
+    
+    #%% Load a model saved with save (no training needed)
+    @classmethod
+    def load(cls, path):
+        
+        from Model_IO import read_config, load_weights
+        
+        config = read_config(path)
+        
+        # Rebuild the networks (x_train is only used for the input dimension)
+        x_dummy = np.zeros([1, config['input_shape']])
+        model = cls(x_dummy, config['data_type'], config['lamda'], config['n_epoch'])
+        
+        load_weights(path, {'discriminator': model.discriminator, 'generator': model.generator}, model.optimizer_weights)
+        
+        return model
 
 
 #%% Main Function
@@ -232,26 +344,8 @@ if __name__ == '__main__':
     # 4. Selected features
     score = 1.*(Sel_Prob_Test > 0.5)
     
-    #%% Performance Metrics
-    def performance_metric(score, g_truth):
-
-        n = len(score)
-        Temp_TPR = np.zeros([n,])
-        Temp_FDR = np.zeros([n,])
-        
-        for i in range(n):
-    
-            # TPR    
-            TPR_Nom = np.sum(score[i,:] * g_truth[i,:])
-            TPR_Den = np.sum(g_truth[i,:])
-            Temp_TPR[i] = 100 * float(TPR_Nom)/float(TPR_Den+1e-8)
-        
-            # FDR
-            FDR_Nom = np.sum(score[i,:] * (1-g_truth[i,:]))
-            FDR_Den = np.sum(score[i,:])
-            Temp_FDR[i] = 100 * float(FDR_Nom)/float(FDR_Den+1e-8)
-    
-        return np.mean(Temp_TPR), np.mean(Temp_FDR), np.std(Temp_TPR), np.std(Temp_FDR)
+    #%% Performance Metrics (vectorized TPR / FDR)
+    from Performance_Metrics import performance_metric
     
     #%% Output
         
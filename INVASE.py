@@ -12,18 +12,32 @@ Instance-wise Variable Selection (INVASE) - with baseline networks
 '''
 
 #%% Necessary packages
-# 1. Keras
-from keras.layers import Input, Dense, Multiply
-from keras.layers import BatchNormalization
-from keras.models import Sequential, Model
-from keras.optimizers import Adam
-from keras import regularizers
-from keras import backend as K
+import time
+
+# 1. Keras and TensorFlow (imported on the first model construction, see load_backend)
+Input = Dense = Multiply = BatchNormalization = None
+Sequential = Model = Adam = regularizers = K = tf = None
 
 # 2. Others
-import tensorflow as tf
 import numpy as np
-from sklearn.metrics import roc_auc_score, average_precision_score, accuracy_score
+
+#%% Lazy import of Keras and TensorFlow
+def load_backend():
+    
+    global Input, Dense, Multiply, BatchNormalization, Sequential, Model, Adam, regularizers, K, tf
+    
+    # Already imported
+    if K is not None:
+        return
+    
+    from keras.layers import Input, Dense, Multiply
+    from keras.layers import BatchNormalization
+    from keras.models import Sequential, Model
+    from keras.optimizers import Adam
+    from keras import regularizers
+    from keras import backend as K
+    
+    import tensorflow as tf
 
 #%% Define INVASE class
 class INVASE():
@@ -32,9 +46,67 @@ class INVASE():
     '''
     x_train: training samples
     data_type: Syn1 to Syn 6
+    learning_rate: Adam learning rate of all networks, or a dict {'predictor': ..., 'selector': ..., 'baseline': ...}
+                   (each network has its own optimizer and moment state)
+    lr_schedule: optional learning rate schedule, function(iteration, learning_rate) -> learning_rate (as the Keras LearningRateScheduler),
+                 for all networks or a dict by network name (not saved with the model)
+    step_mode: 'classic' (separate predict / train_on_batch calls), 
+               'shared' (critic outputs taken from the training forward pass) or 
+               'fused' (one graph call per iteration)
+    seed: seed of the in-graph selection mask sampling (None: drawn at random, then kept in the saved model)
+    dtype: floating point type of the inputs and outputs (should match the Keras floatx, e.g. 'float32' or 'float16')
+    is_logging_enabled: print the progress
+    collect_stats: record the per-phase timing (self.stats, see Training_Stats)
+    stats_path: JSONL file of the training statistics (None: no file, only used with collect_stats)
     '''
-    def __init__(self, x_train, data_type, n_epoch, is_logging_enabled=True, learning_rate=0.0001):
+    def __init__(self, x_train, data_type, n_epoch, is_logging_enabled=True, learning_rate=0.0001, step_mode='classic', seed=None, dtype='float32', stats_path=None,
+                 lr_schedule=None, collect_stats=False):
         self.is_logging_enabled = is_logging_enabled
+        self.collect_stats = collect_stats
+        self.stats_path = stats_path
+        self.stats = None
+        
+        # Import Keras and TensorFlow
+        load_backend()
+        
+        # Constructor arguments (to rebuild the model in load)
+        self.data_type = data_type
+        self.learning_rate = learning_rate
+        
+        names = ['predictor', 'selector', 'baseline']
+        
+        # Learning rate and schedule of each network
+        if isinstance(learning_rate, dict):
+            if sorted(learning_rate) != sorted(names):
+                raise ValueError('learning_rate should have the keys predictor, selector and baseline: ' + str(sorted(learning_rate)))
+            learning_rates = learning_rate
+        else:
+            learning_rates = {name: learning_rate for name in names}
+        
+        if lr_schedule is None:
+            self.lr_schedule = None
+        elif isinstance(lr_schedule, dict):
+            if not set(lr_schedule) <= set(names):
+                raise ValueError('lr_schedule should have keys among predictor, selector and baseline: ' + str(sorted(lr_schedule)))
+            self.lr_schedule = lr_schedule
+        else:
+            self.lr_schedule = {name: lr_schedule for name in names}
+        
+        if step_mode not in ['classic', 'shared', 'fused']:
+            raise ValueError('step_mode should be classic, shared or fused: ' + str(step_mode))
+        self.step_mode = step_mode
+        
+        # The masks are sampled from (seed, iteration), so that a resumed run draws the same masks
+        # (a random seed is replaced by the one of the checkpoint on resume, see check_resume)
+        self.seed_is_random = seed is None
+        self.seed = int(np.random.SeedSequence().generate_state(1)[0]) if seed is None else int(seed)
+        self.seed_variable = K.variable(self.seed, dtype='int64', name='mask_seed')
+        self.iteration = 0
+        
+        dtype = np.dtype(dtype).name
+        if dtype != K.floatx():
+            raise ValueError('dtype should match the Keras floatx (' + K.floatx() + '), set it with keras.backend.set_floatx: ' + str(dtype))
+        self.dtype = dtype
         
         self.batch_size = min(1000, x_train.shape[0])      # Batch size
         self.epochs = n_epoch        # Epoch size (large epoch is needed due to the policy gradient framework)
@@ -45,23 +117,47 @@ class INVASE():
         # Activation. (For Syn1 and 2, relu, others, selu)
         self.activation = 'relu' if data_type in ['Syn1','Syn2'] else 'selu' # Why SeLu?
 
-        # Use Adam optimize
-        optimizer = Adam(lr=learning_rate)
+        # Use Adam optimize (one instance per network)
+        self.optimizers = {name: Adam(lr=learning_rates[name]) for name in names}
+        self.current_learning_rates = {name: float(lr) for name, lr in learning_rates.items()}
         
-        # Build and compile the predictor (critic)
-        self.predictor = self.build_base_network()
+        # Build and compile the predictor (critic) on the masked features
+        self.predictor = self.build_base_network(is_masked=True)
         # Use categorical cross entropy as the loss
-        self.predictor.compile(loss='categorical_crossentropy', optimizer=optimizer, metrics=['acc'])
+        self.predictor.compile(loss='categorical_crossentropy', optimizer=self.optimizers['predictor'], metrics=['acc'])
 
         # Build the selector (actor)
         self.selector = self.build_selector()
         # Use custom loss (my loss)
-        self.selector.compile(loss=self.my_loss, optimizer=optimizer)
+        self.selector.compile(loss=self.my_loss, optimizer=self.optimizers['selector'])
 
         # Build and compile the baseline
         self.baseline = self.build_base_network()
         # Use categorical cross entropy as the loss
-        self.baseline.compile(loss='categorical_crossentropy', optimizer=optimizer, metrics=['acc'])
+        self.baseline.compile(loss='categorical_crossentropy', optimizer=self.optimizers['baseline'], metrics=['acc'])
+        
+        # Optimizer state variables of each update (saved with the model)
+        self.optimizer_weights = {}
+        
+        # Build the Keras training functions now, so that their optimizer state exists before any load
+        for name, model in [('predictor', self.predictor), ('selector', self.selector), ('baseline', self.baseline)]:
+            model._make_train_function()
+            self.optimizer_weights[name] = list(model.optimizer.weights)
+        
+        # Build the selection (probability and sampled mask) function
+        self.sampler = self.build_sampler()
+        
+        # Build the inference function (selector, baseline and predictor in one call)
+        self.inference_function = self.build_inference()
+        
+        # Build the critic steps (update and output in one forward pass)
+        if self.step_mode == 'shared':
+            self.predictor_step = self.build_critic_step('predictor_step', self.predictor, n_inputs = 2)
+            self.baseline_step = self.build_critic_step('baseline_step', self.baseline, n_inputs = 1)
+        
+        # Build the fused training step
+        if self.step_mode == 'fused':
+            self.train_step = self.build_train_step()
 
     #%% Custom loss definition
     def my_loss(self, y_true, y_pred):
@@ -105,13 +201,16 @@ class INVASE():
         model.add(Dense(100, activation=self.activation, name='s/dense2', kernel_regularizer=regularizers.l2(1e-3)))
         model.add(Dense(self.input_shape, activation = 'sigmoid', name='s/dense3', kernel_regularizer=regularizers.l2(1e-3)))
 
-        feature = Input(shape=(self.input_shape,), dtype='float32')
+        feature = Input(shape=(self.input_shape,), dtype=self.dtype)
         selection_prob = model(feature)
 
         return Model(feature, selection_prob)
         
     #%% Baseline & predictor
-    def build_base_network(self):
+    '''
+    is_masked: if True, the network has two inputs (features and selection mask) and sees only the selected features
+    '''
+    def build_base_network(self, is_masked=False):
 
         model = Sequential()
                 
@@ -121,82 +220,544 @@ class INVASE():
         model.add(BatchNormalization())
         model.add(Dense(2, activation ='softmax', name = 'dense3', kernel_regularizer=regularizers.l2(1e-3)))
         
-        feature = Input(shape=(self.input_shape,), dtype='float32')       
-        prob = model(feature)
+        feature = Input(shape=(self.input_shape,), dtype=self.dtype)       
+        
+        if not is_masked:
+            prob = model(feature)
+            return Model(feature, prob)
+        
+        # Selected features
+        select = Input(shape=(self.input_shape,), dtype=self.dtype)
+        
+        # Element-wise multiplication
+        model_input = Multiply()([feature, select])
+        prob = model(model_input)
 
-        return Model(feature, prob)
+        return Model([feature, select], prob)
 
     #%% Sampling the features based on the output of the generator
-    def Sample_M(self, gen_prob):
+    '''
+    gen_prob: selection probability tensor
+    step: int64 scalar tensor (training iteration)
+    Bernoulli sampling in the graph (mask = 1 if U < gen_prob, U ~ Uniform(0,1))
+    The noise is a function of (seed, step) only (stateless), so it does not depend on the previous calls.
+    '''
+    def Sample_M(self, gen_prob, step):
         
-        # Shape of the selection probability
-        n = gen_prob.shape[0]
-        d = gen_prob.shape[1]
+        # Uniform noise with the shape of the selection probability
+        noise_seed = K.stack([self.seed_variable, step])
+        noise = tf.contrib.stateless.stateless_random_uniform(K.shape(gen_prob), seed=noise_seed, dtype=self.dtype)
                 
         # Sampling
-        samples = np.random.binomial(1, gen_prob, (n,d))
+        samples = K.cast(K.less(noise, gen_prob), self.dtype)
         
         return samples
 
-  #%% Training procedure
-    def train(self, x_train, y_train):
+    #%% Selection probability and sampled mask in one call
+    '''
+    Inputs: [x, iteration]
+    Outputs: [sel_prob, sel_mask]
+    '''
+    def build_sampler(self):
+        
+        feature = K.placeholder(shape=(None, self.input_shape), dtype=self.dtype)
+        step = K.placeholder(shape=(), dtype='int64')
+        
+        sel_prob = self.selector(feature)
+        sel_mask = self.Sample_M(sel_prob, step)
+        
+        return K.function([feature, step], [sel_prob, sel_mask])
+
+    #%% Parameter updates of a network (keeps track of the new optimizer state for save / load)
+    def get_updates(self, name, model, loss):
+        
+        updates = model.optimizer.get_updates(loss=loss, params=model.trainable_weights)
+        self.optimizer_weights[name] = list(model.optimizer.weights)
+        
+        return updates
+
+    #%% Critic (predictor & baseline) loss and accuracy
+    def critic_loss(self, model, y_true, prob):
+        
+        # Categorical cross entropy with the kernel regularization terms
+        # (model.losses, as compile: get_losses_for(None) repeats them for every call of the model on new tensors)
+        return K.mean(K.categorical_crossentropy(y_true, prob)) + sum(model.losses)
+    
+    def critic_accuracy(self, y_true, prob):
+        
+        # Same as the 'acc' metric for categorical cross entropy
+        return K.mean(K.cast(K.equal(K.argmax(y_true, axis = -1), K.argmax(prob, axis = -1)), K.floatx()))
+
+    #%% Critic training step returning the output of its own forward pass
+    '''
+    The output is computed with the pre-update weights (in training phase), so no separate predict call is needed.
+    The loss and the update are the same as train_on_batch (cross entropy and the deduplicated model.losses).
+    Inputs: model inputs + [y_batch, learning_phase]
+    Outputs: [loss, acc, prob]
+    '''
+    def build_critic_step(self, name, model, n_inputs):
+        
+        inputs = [K.placeholder(shape=(None, self.input_shape), dtype=self.dtype) for _ in range(n_inputs)]
+        y_batch = K.placeholder(shape=(None, 2), dtype=self.dtype)
+        
+        model_input = inputs if n_inputs > 1 else inputs[0]
+        prob = model(model_input)
+        
+        loss = self.critic_loss(model, y_batch, prob)
+        
+        # Parameter and batch norm updates
+        updates = self.get_updates(name, model, loss)
+        updates += model.get_updates_for(model_input)
+        
+        return K.function(inputs + [y_batch, K.learning_phase()], [loss, self.critic_accuracy(y_batch, prob), prob], updates=updates)
+
+    #%% Fused training step
+    '''
+    Selector forward, mask sampling, predictor / baseline forward and update, and selector update in one graph.
+    All forward passes use the pre-update weights, as in the classic loop, and the losses are the same as in the classic loop.
+    Unlike the classic loop (predict, batch norm with the moving averages), the predictor and baseline outputs given to
+    the selector come from the training forward pass (batch norm with the batch statistics), as in the shared mode.
+    Each network is updated by its own optimizer (self.optimizers), so every Adam iteration counter
+    (and its bias correction) advances once per step.
+    Inputs: [x_batch, y_batch, iteration, learning_phase]
+    Outputs: [d_loss, d_acc, v_loss, v_acc, g_loss]
+    '''
+    def build_train_step(self):
 
-        # For each epoch (actually iterations!)
-        for epoch in range(self.epochs):
+        x_batch = K.placeholder(shape=(None, self.input_shape), dtype=self.dtype)
+        y_batch = K.placeholder(shape=(None, 2), dtype=self.dtype)
+        step = K.placeholder(shape=(), dtype='int64')
 
-            #%% Train predictor
-            # Select a random batch of samples
-            idx = np.random.randint(0, x_train.shape[0], self.batch_size)
-            x_batch = x_train[idx,:]
-            y_batch = y_train[idx,:]
+        # Selection probability and sampled mask
+        sel_prob = self.selector(x_batch)
+        sel_mask = self.Sample_M(sel_prob, step)
 
-            # Generate a batch of probabilities of feature selection
-            sel_prob = self.selector.predict(x_batch)
+        # Predictor and baseline outputs
+        dis_prob = self.predictor([x_batch, sel_mask])
+        val_prob = self.baseline(x_batch)
+
+        # Losses (with the kernel regularization terms)
+        d_loss = self.critic_loss(self.predictor, y_batch, dis_prob)
+        v_loss = self.critic_loss(self.baseline, y_batch, val_prob)
+
+        # Use three things as the y_true: sel_prob, dis_prob, val_prob and ground truth (y_batch)
+        y_batch_final = K.stop_gradient(K.concatenate([sel_prob, dis_prob, val_prob, y_batch], axis = 1))
+        g_loss = self.my_loss(y_batch_final, sel_prob) + sum(self.selector.losses)
+
+        # Parameter updates of the three networks and the batch norm statistics
+        updates = self.get_updates('fused/predictor', self.predictor, d_loss)
+        updates += self.get_updates('fused/baseline', self.baseline, v_loss)
+        updates += self.get_updates('fused/selector', self.selector, g_loss)
+        updates += self.predictor.get_updates_for([x_batch, sel_mask]) + self.baseline.get_updates_for(x_batch)
+
+        return K.function([x_batch, y_batch, step, K.learning_phase()],
+                          [d_loss, self.critic_accuracy(y_batch, dis_prob), v_loss, self.critic_accuracy(y_batch, val_prob), g_loss],
+                          updates=updates)
+
+    #%% Learning rates of the iteration (only set when the schedule changes them)
+    def update_learning_rates(self, epoch):
+        
+        for name, schedule in self.lr_schedule.items():
             
-            # Sampling the features based on the generated probability and overlaying mask on input
-            sel_mask = self.Sample_M(sel_prob)
-            sel_feat = Multiply()([x_batch, sel_mask])     
+            old_value = self.current_learning_rates[name]
+            new_value = schedule(epoch, old_value)
             
-            # Compute the prediction of the critic based on the sampled features (used for selector training)
-            dis_prob = self.predictor.predict(sel_feat)
+            if new_value != old_value:
+                self.set_learning_rates({name: new_value})
+    
+    #%% Set the current learning rates ({network name: learning rate})
+    def set_learning_rates(self, learning_rates):
+        
+        for name, lr in learning_rates.items():
+            K.set_value(self.optimizers[name].lr, lr)
+            self.current_learning_rates[name] = float(lr)
 
-            # Train the predictor
-            d_loss = self.predictor.train_on_batch(sel_feat, y_batch)
+    #%% Classic training step (separate predict / train_on_batch calls)
+    '''
+    stats: optional TrainingStats (the phase timing starts at t)
+    '''
+    def classic_step(self, x_batch, y_batch, stats=None, t=None):
 
-            #%% Train the baseline
+        #%% Train predictor
+        # Generate a batch of probabilities of feature selection and sample the features based on it
+        sel_prob, sel_mask = self.sampler([x_batch, self.iteration])
+        
+        if stats is not None:
+            t = stats.lap('sample', t)
+        
+        # Compute the prediction of the critic based on the sampled features (used for selector training)
+        dis_prob = self.predictor.predict([x_batch, sel_mask])
 
-            # Compute the prediction of the critic based on the sampled features (used for selector training)
-            val_prob = self.baseline.predict(x_batch)
+        # Train the predictor (the mask is overlaid on the input inside the predictor)
+        d_loss = self.predictor.train_on_batch([x_batch, sel_mask], y_batch)
+        
+        if stats is not None:
+            t = stats.lap('predictor', t)
 
-            # Train the predictor
-            v_loss = self.baseline.train_on_batch(x_batch, y_batch)
-            
-            #%% Train selector
-            # Use three things as the y_true: sel_prob, dis_prob, and ground truth (y_batch)
-            y_batch_final = np.concatenate( (sel_prob, np.asarray(dis_prob), np.asarray(val_prob), y_batch), axis = 1 )
+        #%% Train the baseline
+
+        # Compute the prediction of the critic based on the sampled features (used for selector training)
+        val_prob = self.baseline.predict(x_batch)
 
-            # Train the selector
-            g_loss = self.selector.train_on_batch(x_batch, y_batch_final)
+        # Train the predictor
+        v_loss = self.baseline.train_on_batch(x_batch, y_batch)
+        
+        if stats is not None:
+            t = stats.lap('baseline', t)
+        
+        #%% Train selector
+        # Use three things as the y_true: sel_prob, dis_prob, and ground truth (y_batch)
+        y_batch_final = np.concatenate( (sel_prob, np.asarray(dis_prob), np.asarray(val_prob), y_batch), axis = 1 )
+
+        # Train the selector
+        g_loss = self.selector.train_on_batch(x_batch, y_batch_final)
+        
+        if stats is not None:
+            stats.lap('selector', t)
+        
+        return d_loss, v_loss, g_loss
+
+    #%% Shared training step (critic outputs from the same pass that computes their update)
+    def shared_step(self, x_batch, y_batch, stats=None, t=None):
+        
+        # Selection probability and sampled mask
+        sel_prob, sel_mask = self.sampler([x_batch, self.iteration])
+        
+        if stats is not None:
+            t = stats.lap('sample', t)
+        
+        # Train the predictor and the baseline, keeping their pre-update outputs
+        d_out = self.predictor_step([x_batch, sel_mask, y_batch, 1])
+        
+        if stats is not None:
+            t = stats.lap('predictor', t)
+        
+        v_out = self.baseline_step([x_batch, y_batch, 1])
+        
+        if stats is not None:
+            t = stats.lap('baseline', t)
+        
+        d_loss, dis_prob = d_out[0:2], d_out[2]
+        v_loss, val_prob = v_out[0:2], v_out[2]
+        
+        # Train the selector
+        y_batch_final = np.concatenate( (sel_prob, dis_prob, val_prob, y_batch), axis = 1 )
+        g_loss = self.selector.train_on_batch(x_batch, y_batch_final)
+        
+        if stats is not None:
+            stats.lap('selector', t)
+        
+        return d_loss, v_loss, g_loss
+
+    #%% Fused training step (one graph call for all three networks)
+    def fused_step(self, x_batch, y_batch, stats=None, t=None):
+        
+        step_out = self.train_step([x_batch, y_batch, self.iteration, 1])
+        
+        if stats is not None:
+            stats.lap('step', t)
+        
+        return step_out[0:2], step_out[2:4], step_out[4]
+
+  #%% Training procedure
+    '''
+    batch_source: optional source of (x_batch, y_batch) with a next() method (e.g. Batch_Source.PrefetchBatchSource),
+                  ideally producing self.dtype batches (Batch_Source.BatchSource(..., dtype = model.dtype)).
+                  If None, batches are sampled with replacement from x_train / y_train.
+    callbacks: optional list of Callbacks.Callback
+    validation_data: (x_val, y_val) evaluated every eval_every iterations and passed to on_eval
+    checkpoint_path: checkpoint file written every checkpoint_every iterations (see Checkpoint). The model is copied on the training 
+                     thread and written in the background; on_checkpoint is called (on the training thread) once the file is written.
+                     The file can also be loaded with load.
+    resume_from: checkpoint file to resume the training from (weights, optimizer state, iteration and random states).
+                 The model should be built with the same step_mode, dtype and shapes (ValueError otherwise), and with seed = None 
+                 or the seed of the checkpoint (INVASE.load(checkpoint) also works).
+    '''
+    def train(self, x_train, y_train, batch_source=None, callbacks=None, validation_data=None, eval_every=100, 
+              checkpoint_path=None, checkpoint_every=1000, resume_from=None):
 
-            #%% Plot the progress
-            dialog = 'Epoch: '+str(epoch)+', d_loss (Acc)): '+str(d_loss[1])+', v_loss (Acc): '+str(v_loss[1])+', g_loss: '+str(np.round(g_loss,4))
+        # Convert once, so that the batches are not cast in every iteration
+        x_train = np.asarray(x_train, dtype=self.dtype)
+        y_train = np.asarray(y_train, dtype=self.dtype)
 
-            if epoch % 100 == 0:
-                print(dialog)
+        # Training step of the selected mode
+        step = {'classic': self.classic_step, 'shared': self.shared_step, 'fused': self.fused_step}[self.step_mode]
+        
+        # Callbacks (nothing is built or called per iteration without callbacks)
+        if callbacks:
+            from Callbacks import CallbackList, iteration_logs
+            callbacks = CallbackList(callbacks, has_validation = validation_data is not None)
+            callbacks.on_train_begin(self)
+        else:
+            callbacks = None
+        
+        # Resume: restore the model and the training state, then continue after the saved iteration
+        start = 0
+        if resume_from is not None:
+            from Model_IO import read_config, load_weights
+            from Checkpoint import restore_state
+            
+            config = read_config(resume_from)
+            self.check_resume(config)
+            
+            load_weights(resume_from, self.networks(), self.optimizer_weights)
+            start = restore_state(resume_from, batch_source) + 1
+            
+            # Learning rates reached by the schedules (not part of the optimizer weights)
+            self.set_learning_rates(config.get('current_learning_rates', {}))
+        
+        checkpointer = None
+        if checkpoint_path is not None:
+            from Checkpoint import AsyncCheckpointer
+            checkpointer = AsyncCheckpointer(checkpoint_path)
+        
+        # Per-phase timing (optional)
+        stats = None
+        if self.collect_stats:
+            from Training_Stats import TrainingStats
+            stats = self.stats = TrainingStats(self.batch_size, self.stats_path)
+        
+        self.stop_training = False
+        t = t_start = None
+        epoch = start - 1
+        completed = False
+
+        # The statistics file and the pending checkpoint are closed even if the training fails
+        try:
+            
+            # For each epoch (actually iterations!)
+            for epoch in range(start, self.epochs):
+                
+                # Iteration of the mask sampling
+                self.iteration = epoch
+                
+                # Learning rate schedules
+                if self.lr_schedule is not None:
+                    self.update_learning_rates(epoch)
+                
+                if stats is not None:
+                    t = time.perf_counter()
+                if callbacks is not None:
+                    t_start = time.perf_counter()
+
+                # Select a random batch of samples
+                if batch_source is None:
+                    idx = np.random.randint(0, x_train.shape[0], self.batch_size)
+                    x_batch = x_train[idx,:]
+                    y_batch = y_train[idx,:]
+                else:
+                    x_batch, y_batch = batch_source.next()
+                    
+                    # Batches of another type than self.dtype (no copy when they match, see BatchSource dtype)
+                    x_batch = np.asarray(x_batch, dtype=self.dtype)
+                    y_batch = np.asarray(y_batch, dtype=self.dtype)
+                    
+                if stats is not None:
+                    t = stats.lap('batch', t)
+
+                # Train predictor, baseline and selector
+                d_loss, v_loss, g_loss = step(x_batch, y_batch, stats, t)
+
+                #%% Record the statistics and plot the progress
+                if stats is not None:
+                    stats.end_iteration(epoch, d_loss, v_loss, g_loss)
+                
+                if self.is_logging_enabled:
+                    
+                    if epoch % 100 == 0:
+                        dialog = 'Epoch: '+str(epoch)+', d_loss (Acc)): '+str(d_loss[1])+', v_loss (Acc): '+str(v_loss[1])+', g_loss: '+str(np.round(g_loss,4))
+                        print(dialog)
+                
+                #%% Callbacks, periodic validation and checkpoints
+                if callbacks is not None:
+                    
+                    callbacks.on_iteration_end(self, epoch, iteration_logs(d_loss, g_loss, v_loss, time.perf_counter() - t_start))
+                    
+                    if validation_data is not None and (epoch + 1) % eval_every == 0:
+                        callbacks.on_eval(self, epoch, self.evaluate(*validation_data))
+                
+                if checkpointer is not None:
+                    
+                    if (epoch + 1) % checkpoint_every == 0:
+                        checkpointer.submit(self.checkpoint_arrays(epoch, batch_source), epoch)
+                    
+                    # Checkpoints written in the background since the previous iteration
+                    if callbacks is not None:
+                        for written_epoch in checkpointer.written():
+                            callbacks.on_checkpoint(self, written_epoch, checkpoint_path)
+                
+                # Stop requested by a callback
+                if self.stop_training:
+                    break
+            
+            completed = True
+        
+        finally:
+            
+            if stats is not None:
+                stats.close()
+            
+            # Wait for the last checkpoint
+            if checkpointer is not None:
+                checkpointer.close(raise_error = completed)
+        
+        # Last checkpoints (written after the end of the loop)
+        if checkpointer is not None and callbacks is not None:
+            for written_epoch in checkpointer.written():
+                callbacks.on_checkpoint(self, written_epoch, checkpoint_path)
+            
+        if callbacks is not None:
+            callbacks.on_train_end(self, {'epochs': epoch + 1})
+    
+    #%% Inference function
+    '''
+    Selection probability, baseline prediction and predictor prediction on the selected features (probability > 0.5)
+    Inputs: [x, learning_phase]
+    Outputs: [sel_prob, val_prob, dis_prob]
+    '''
+    def build_inference(self):
+        
+        feature = K.placeholder(shape=(None, self.input_shape), dtype=self.dtype)
+        
+        sel_prob = self.selector(feature)
+        score = K.cast(K.greater(sel_prob, 0.5), self.dtype)
+        
+        val_prob = self.baseline(feature)
+        dis_prob = self.predictor([feature, score])
+        
+        return K.function([feature, K.learning_phase()], [sel_prob, val_prob, dis_prob])
+    
+    #%% Batched inference
+    '''
+    x: samples (any number of rows, e.g. a memory-mapped array)
+    batch_size: number of rows per call (bounds the memory of the intermediate tensors)
+    
+    Returns sel_prob (n x d), val_prediction (n x 2), dis_prediction (n x 2)
+    '''
+    def inference(self, x, batch_size=10000):
+        
+        n = x.shape[0]
+        
+        # Output initialization
+        sel_prob = np.zeros([n, self.input_shape], dtype=self.dtype)
+        val_prediction = np.zeros([n, 2], dtype=self.dtype)
+        dis_prediction = np.zeros([n, 2], dtype=self.dtype)
+        
+        for start in range(0, n, batch_size):
+            
+            stop = min(start + batch_size, n)
+            x_batch = np.asarray(x[start:stop], dtype=self.dtype)
+            
+            sel_prob[start:stop], val_prediction[start:stop], dis_prediction[start:stop] = self.inference_function([x_batch, 0])
+            
+        return sel_prob, val_prediction, dis_prediction
+    
+    #%% Hyper-parameters and networks (saved with the model)
+    def config(self):
+        
+        return {'data_type': self.data_type, 'n_epoch': self.epochs, 'is_logging_enabled': self.is_logging_enabled, 'collect_stats': self.collect_stats,
+                'learning_rate': self.learning_rate, 'step_mode': self.step_mode, 'seed': self.seed, 'dtype': self.dtype,
+                'input_shape': self.input_shape, 'batch_size': self.batch_size, 'tau': self.tau, 'activation': self.activation,
+                'current_learning_rates': self.current_learning_rates}
+    
+    def networks(self):
+        
+        return {'predictor': self.predictor, 'selector': self.selector, 'baseline': self.baseline}
+    
+    #%% Save the trained model (weights, optimizer state and hyper-parameters) in a single file
+    def save(self, path):
+        
+        from Model_IO import save_model
+        
+        save_model(path, self.config(), self.networks(), self.optimizer_weights)
+    
+    #%% Check that a checkpoint can be resumed by this model (and take its mask seed)
+    def check_resume(self, config):
+        
+        own_config = self.config()
+        
+        for key in ['step_mode', 'dtype', 'input_shape', 'batch_size']:
+            if config[key] != own_config[key]:
+                raise ValueError('Cannot resume: the checkpoint has ' + key + ' = ' + str(config[key]) + ', the model ' + str(own_config[key]))
+        
+        if config['seed'] != self.seed:
+            
+            # An explicit seed is kept, a random one is replaced by the seed of the checkpoint
+            if not self.seed_is_random:
+                raise ValueError('Cannot resume: the checkpoint has seed = ' + str(config['seed']) + ', the model ' + str(self.seed))
+            
+            self.seed = config['seed']
+            K.set_value(self.seed_variable, self.seed)
+    
+    #%% Checkpoint of the training: model arrays and training state after iteration epoch
+    def checkpoint_arrays(self, epoch, batch_source=None):
+        
+        from Model_IO import model_arrays
+        from Checkpoint import state_arrays
+        
+        arrays = model_arrays(self.config(), self.networks(), self.optimizer_weights)
+        arrays.update(state_arrays(epoch, batch_source))
+        
+        return arrays
+    
+    #%% Load a model saved with save (no training needed)
+    '''
+    lr_schedule: learning rate schedule of the further training (schedules are not saved, the learning rates they reached are)
+    '''
+    @classmethod
+    def load(cls, path, lr_schedule=None):
+        
+        from Model_IO import read_config, load_weights
+        
+        config = read_config(path)
+        
+        # Rebuild the networks (x_train is only used for the batch size and the input dimension)
+        x_dummy = np.zeros([config['batch_size'], config['input_shape']])
+        model = cls(x_dummy, config['data_type'], config['n_epoch'], is_logging_enabled=config['is_logging_enabled'], 
+                    learning_rate=config['learning_rate'], step_mode=config['step_mode'], seed=config['seed'], dtype=config['dtype'],
+                    collect_stats=config.get('collect_stats', False), lr_schedule=lr_schedule)
+        
+        load_weights(path, model.networks(), model.optimizer_weights)
+        
+        # Learning rates reached by the schedules during the training
+        model.set_learning_rates(config.get('current_learning_rates', {}))
+        
+        return model
+    
+    #%% Export the selector weights for the NumPy-only inference (Selector_Numpy.NumpySelector)
+    def export_selector(self, path):
+        
+        from Selector_Numpy import save_selector
+        
+        save_selector(path, self.selector.get_weights(), self.activation)
+    
+    #%% Validation metrics (accuracy of the predictor / baseline and selection rate)
+    def evaluate(self, x, y, batch_size=10000):
+        
+        sel_prob, val_prediction, dis_prediction = self.inference(x, batch_size)
+        
+        label = np.argmax(y, axis = 1)
+        
+        return {'d_acc': float(np.mean(np.argmax(dis_prediction, axis = 1) == label)),
+                'v_acc': float(np.mean(np.argmax(val_prediction, axis = 1) == label)),
+                'sel_rate': float(np.mean(sel_prob > 0.5))}
     
     #%% Selected Features        
-    def output(self, x_train):
+    def output(self, x_train, batch_size=10000):
         
-        gen_prob = self.generator.predict(x_train)
+        gen_prob = self.selector.predict(np.asarray(x_train, dtype=self.dtype), batch_size=batch_size)
         
-        return np.asarray(gen_prob)
+        return np.asarray(gen_prob, dtype=self.dtype)
      
     #%% Prediction Results 
-    def get_prediction(self, x_train, m_train):
+    def get_prediction(self, x_train, m_train, batch_size=10000):
         
-        val_prediction = self.valfunction.predict(x_train)
+        x_train = np.asarray(x_train, dtype=self.dtype)
+        m_train = np.asarray(m_train, dtype=self.dtype)
         
-        dis_prediction = self.discriminator.predict([x_train, m_train])
+        val_prediction = self.baseline.predict(x_train, batch_size=batch_size)
+        
+        dis_prediction = self.predictor.predict([x_train, m_train], batch_size=batch_size)
         
         return np.asarray(val_prediction), np.asarray(dis_prediction)
 
@@ -204,8 +765,8 @@ class INVASE():
 #%% Main Function
 if __name__ == '__main__':
         
-    # Data generation function import
-    from Data_Generation import generate_data
+    # Data generation function import (cached on disk)
+    from Data_Cache import load_data
     
     #%% Parameters
     # Synthetic data type    
@@ -224,53 +785,42 @@ if __name__ == '__main__':
     # Seeds (different seeds for training and testing)
     train_seed = 0
     test_seed = 1
+    
+    # Dataset cache (directory and disk budget)
+    cache_dir = 'data_cache'
+    cache_bytes = 2 * 1024**3
+    
+    # Floating point type of the whole pipeline
+    dtype = np.float32
         
     #%% Data Generation (Train/Test)
     def create_data(data_type, data_out): 
         
-        x_train, y_train, g_train = generate_data(n = train_N, data_type = data_type, seed = train_seed, out = data_out)  
-        x_test,  y_test,  g_test  = generate_data(n = test_N,  data_type = data_type, seed = test_seed,  out = data_out)  
+        x_train, y_train, g_train = load_data(n = train_N, data_type = data_type, seed = train_seed, out = data_out, cache_dir = cache_dir, max_bytes = cache_bytes, dtype = dtype)  
+        x_test,  y_test,  g_test  = load_data(n = test_N,  data_type = data_type, seed = test_seed,  out = data_out, cache_dir = cache_dir, max_bytes = cache_bytes, dtype = dtype)  
     
         return x_train, y_train, g_train, x_test, y_test, g_test
     
     x_train, y_train, g_train, x_test, y_test, g_test = create_data(data_type, data_out)
 
     #%% 
+    # Number of iterations
+    n_epoch = 10000
+    
     # 1. INVASE Class call
-    INVASE_Alg = INVASE(x_train, data_type)
+    INVASE_Alg = INVASE(x_train, data_type, n_epoch)
     
     # 2. Algorithm training
     INVASE_Alg.train(x_train, y_train)
     
-    # 3. Get the selection probability on the testing set
-    Sel_Prob_Test = INVASE_Alg.output(x_test)
+    # 3. Get the selection probability and the predictions on the testing set (one pass)
+    Sel_Prob_Test, val_predict, dis_predict = INVASE_Alg.inference(x_test)
     
     # 4. Selected features
     score = 1.*(Sel_Prob_Test > 0.5)
     
-    # 5. Prediction
-    val_predict, dis_predict = INVASE_Alg.get_prediction(x_test, score)
-    
-    #%% Performance Metrics
-    def performance_metric(score, g_truth):
-
-        n = len(score)
-        Temp_TPR = np.zeros([n,])
-        Temp_FDR = np.zeros([n,])
-        
-        for i in range(n):
-    
-            # TPR    
-            TPR_Nom = np.sum(score[i,:] * g_truth[i,:])
-            TPR_Den = np.sum(g_truth[i,:])
-            Temp_TPR[i] = 100 * float(TPR_Nom)/float(TPR_Den+1e-8)
-        
-            # FDR
-            FDR_Nom = np.sum(score[i,:] * (1-g_truth[i,:]))
-            FDR_Den = np.sum(score[i,:])
-            Temp_FDR[i] = 100 * float(FDR_Nom)/float(FDR_Den+1e-8)
-    
-        return np.mean(Temp_TPR), np.mean(Temp_FDR), np.std(Temp_TPR), np.std(Temp_FDR)
+    #%% Performance Metrics (vectorized TPR / FDR)
+    from Performance_Metrics import performance_metric
     
     #%% Output
     TPR_mean, FDR_mean, TPR_std, FDR_std = performance_metric(score, g_test)
@@ -278,32 +828,11 @@ if __name__ == '__main__':
     print('TPR mean: ' + str(np.round(TPR_mean,1)) + '\%, ' + 'TPR std: ' + str(np.round(TPR_std,1)) + '\%, '  )
     print('FDR mean: ' + str(np.round(FDR_mean,1)) + '\%, ' + 'FDR std: ' + str(np.round(FDR_std,1)) + '\%, '  )
         
-    #%% Prediction Results
-    Predict_Out = np.zeros([20,3,2])    
-
-    for i in range(20):
-        
-        # different test seed
-        test_seed = i+2
-        _, _, _, x_test, y_test, _ = create_data(data_type, data_out)  
-                
-        # 1. Get the selection probability on the testing set
-        Sel_Prob_Test = INVASE_Alg.output(x_test)
-    
-        # 2. Selected features
-        score = 1.*(Sel_Prob_Test > 0.5)
-    
-        # 3. Prediction
-        val_predict, dis_predict = INVASE_Alg.get_prediction(x_test, score)
-        
-        # 4. Prediction Results
-        Predict_Out[i,0,0] = roc_auc_score(y_test[:,1], val_predict[:,1])
-        Predict_Out[i,1,0] = average_precision_score(y_test[:,1], val_predict[:,1])
-        Predict_Out[i,2,0] = accuracy_score(y_test[:,1], 1. * (val_predict[:,1]>0.5) )
+    #%% Prediction Results (20 different test seeds, generated and scored in parallel)
+    from Evaluation import evaluate_seeds
     
-        Predict_Out[i,0,1] = roc_auc_score(y_test[:,1], dis_predict[:,1])
-        Predict_Out[i,1,1] = average_precision_score(y_test[:,1], dis_predict[:,1])
-        Predict_Out[i,2,1] = accuracy_score(y_test[:,1], 1. * (dis_predict[:,1]>0.5) )
+    Predict_Out = evaluate_seeds(INVASE_Alg, data_type, data_out, test_N, seeds = [i+2 for i in range(20)], dtype = dtype, 
+                                 cache_dir = cache_dir, max_bytes = cache_bytes)
             
     # Mean / Var of 20 different testing sets
     Output = np.round(np.concatenate((np.mean(Predict_Out,0),np.std(Predict_Out,0)),axis = 1),4) 
@@ -0,0 +1,86 @@
+'''
+Save / load of trained INVASE and PVS models
+
+---------------------------------------------------
+
+A model is stored in a single .npz file (no pickling):
+- 'config': JSON of the hyper-parameters needed to rebuild the networks
+- 'weights/<network>/<i>': Keras get_weights() of each network (including the batch norm statistics)
+- 'optimizer/<name>/<i>': values of the optimizer state variables (iterations, Adam moments) of each update
+
+Keras is only imported when the model classes call these functions.
+'''
+#%% Necessary packages
+import os
+import json
+
+import numpy as np
+
+#%% Save
+'''
+path: output file
+config: JSON-serializable hyper-parameters
+networks: {name: Keras model}
+optimizer_weights: {name: list of optimizer variables}
+'''
+def save_model(path, config, networks, optimizer_weights):
+
+    write_arrays(path, model_arrays(config, networks, optimizer_weights))
+
+#%% Arrays of a model (snapshot of the current values)
+def model_arrays(config, networks, optimizer_weights):
+
+    from keras import backend as K
+
+    arrays = {'config': np.array(json.dumps(config))}
+
+    for name, model in networks.items():
+        for i, w in enumerate(model.get_weights()):
+            arrays['weights/' + name + '/' + str(i)] = w
+
+    for name, variables in optimizer_weights.items():
+        for i, w in enumerate(K.batch_get_value(variables)):
+            arrays['optimizer/' + name + '/' + str(i)] = w
+
+    return arrays
+
+#%% Write arrays to path (through a temporary file, so that a crash never leaves a partial file)
+def write_arrays(path, arrays):
+
+    tmp_path = path + '.tmp'
+
+    # File object, so that np.savez does not append .npz to the path
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+#%% Hyper-parameters of a saved model
+def read_config(path):
+
+    with np.load(path) as data:
+        return json.loads(str(data['config']))
+
+#%% Restore the network weights and optimizer state of a rebuilt model
+def load_weights(path, networks, optimizer_weights):
+
+    from keras import backend as K
+
+    with np.load(path) as data:
+
+        def arrays(prefix):
+            n = len([key for key in data.files if key.startswith(prefix + '/')])
+            return [data[prefix + '/' + str(i)] for i in range(n)]
+
+        for name, model in networks.items():
+            model.set_weights(arrays('weights/' + name))
+
+        for name, variables in optimizer_weights.items():
+            values = arrays('optimizer/' + name)
+
+            if len(values) != len(variables):
+                raise ValueError('Optimizer state of ' + name + ' does not match the saved model')
+
+            K.batch_set_value(list(zip(variables, values)))
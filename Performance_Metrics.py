@@ -0,0 +1,160 @@
+'''
+Performance metrics of the feature selection (TPR / FDR)
+
+---------------------------------------------------
+
+score: selected features (n x d, 0/1 or boolean)
+g_truth: ground truth relevant features, in any form of Data_Generation.Ground_Truth_Generation
+- dense (0/1 of any type, e.g. float or uint8) or bool: n x d
+- packed (uint8, np.packbits along the features): n x ceil(d/8)
+The form is given by the width of g_truth (with d = 1, a uint8 ground truth is read as dense).
+
+Packed ground truth is never expanded: the score is packed instead and the bits are counted with a lookup table.
+The rows are processed in chunks, so the temporaries stay bounded for large n (e.g. memory-mapped datasets).
+
+Usage (same outputs as the per-row loop of the INVASE scripts):
+    from Performance_Metrics import performance_metric
+    TPR_mean, FDR_mean, TPR_std, FDR_std = performance_metric(score, g_test)
+'''
+#%% Necessary packages
+import numpy as np
+
+# Number of set bits of each byte
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype = np.uint8)
+
+#%% Number of set bits per row of a packed array
+def row_popcount(packed):
+
+    return POPCOUNT[packed].sum(axis = 1, dtype = np.int64)
+
+#%% Per-row counts of the selection
+'''
+Returns (true positives, relevant features, selected features) for each row
+'''
+def selection_counts(score, g_truth):
+
+    select = np.asarray(score) != 0
+    g_truth = np.asarray(g_truth)
+
+    d = select.shape[1]
+
+    # Packed ground truth
+    if g_truth.shape[1] != d:
+
+        if g_truth.dtype != np.uint8 or g_truth.shape[1] != (d + 7) // 8:
+            raise ValueError('g_truth should be n x ' + str(d) + ' (dense) or uint8 n x ' + str((d + 7) // 8) + ' (packed): ' + str(g_truth.shape))
+
+        select = np.packbits(select, axis = 1)
+
+        return row_popcount(select & g_truth), row_popcount(g_truth), row_popcount(select)
+
+    # Dense or boolean ground truth
+    relevant = g_truth != 0
+
+    return np.count_nonzero(select & relevant, axis = 1), np.count_nonzero(relevant, axis = 1), np.count_nonzero(select, axis = 1)
+
+#%% Per-row TPR and FDR (in %)
+'''
+chunk_size: Number of rows processed at once
+'''
+def TPR_FDR(score, g_truth, chunk_size = 100000):
+
+    n = len(score)
+    TPR = np.zeros([n,])
+    FDR = np.zeros([n,])
+
+    for start in range(0, n, chunk_size):
+
+        stop = min(start + chunk_size, n)
+        TP, Relevant, Selected = selection_counts(score[start:stop], g_truth[start:stop])
+
+        TPR[start:stop] = 100 * TP / (Relevant + 1e-8)
+        FDR[start:stop] = 100 * (Selected - TP) / (Selected + 1e-8)
+
+    return TPR, FDR
+
+#%% Mean / std of TPR and FDR
+def performance_metric(score, g_truth, chunk_size = 100000):
+
+    TPR, FDR = TPR_FDR(score, g_truth, chunk_size)
+
+    return np.mean(TPR), np.mean(FDR), np.std(TPR), np.std(FDR)
+
+
+#%% Batched prediction metrics (AUROC, AUPRC, accuracy) over many test sets
+'''
+y_true: binary labels (s x n), one row per test set
+y_score: predicted probability of the positive class (s x n)
+
+All rows are sorted at once; ties are handled as in sklearn 
+(average ranks for AUROC, one threshold per distinct score for AUPRC).
+'''
+
+#%% Tie groups of sorted scores (True at the first / last index of each run of equal scores)
+def tie_groups(sorted_score):
+
+    first = np.ones(sorted_score.shape, dtype = bool)
+    first[:,1:] = sorted_score[:,1:] != sorted_score[:,:-1]
+
+    last = np.ones(sorted_score.shape, dtype = bool)
+    last[:,:-1] = first[:,1:]
+
+    return first, last
+
+#%% Area under the ROC curve (Mann-Whitney statistic with average ranks)
+def batched_auc(y_true, y_score):
+
+    y_score = np.asarray(y_score)
+    n = y_score.shape[1]
+    idx = np.arange(n)
+
+    order = np.argsort(y_score, axis = 1, kind = 'mergesort')
+    s_sorted = np.take_along_axis(y_score, order, axis = 1)
+    y_sorted = np.take_along_axis(np.asarray(y_true) != 0, order, axis = 1)
+
+    # Average rank of each tie group (1-based)
+    first, last = tie_groups(s_sorted)
+    start = np.maximum.accumulate(np.where(first, idx, 0), axis = 1)
+    end = np.minimum.accumulate(np.where(last, idx, n-1)[:,::-1], axis = 1)[:,::-1]
+    ranks = (start + end) / 2. + 1
+
+    P = y_sorted.sum(axis = 1)
+    N = n - P
+
+    return (np.sum(ranks * y_sorted, axis = 1) - P * (P + 1) / 2.) / (P * N)
+
+#%% Average precision (sum over the thresholds of precision x recall increment)
+def batched_average_precision(y_true, y_score):
+
+    y_score = np.asarray(y_score)
+    n = y_score.shape[1]
+    idx = np.arange(n)
+
+    # Decreasing scores
+    order = np.argsort(-y_score, axis = 1, kind = 'mergesort')
+    s_sorted = np.take_along_axis(y_score, order, axis = 1)
+    y_sorted = np.take_along_axis(np.asarray(y_true) != 0, order, axis = 1)
+
+    # True positives and precision at each position; thresholds at the last index of each tie group
+    tps = np.cumsum(y_sorted, axis = 1)
+    precision = tps / (idx + 1.)
+    _, last = tie_groups(s_sorted)
+
+    # True positives of the previous threshold
+    tps_last = np.maximum.accumulate(np.where(last, tps, 0), axis = 1)
+    tps_prev = np.zeros_like(tps)
+    tps_prev[:,1:] = tps_last[:,:-1]
+
+    P = tps[:,-1]
+
+    return np.sum(np.where(last, (tps - tps_prev) * precision, 0), axis = 1) / P
+
+#%% Accuracy of the 0.5 threshold
+def batched_accuracy(y_true, y_score):
+
+    return np.mean((np.asarray(y_score) > 0.5) == (np.asarray(y_true) != 0), axis = 1)
+
+#%% AUROC, AUPRC and accuracy of each test set (s x 3)
+def batched_prediction_metrics(y_true, y_score):
+
+    return np.stack([batched_auc(y_true, y_score), batched_average_precision(y_true, y_score), batched_accuracy(y_true, y_score)], axis = 1)
@@ -0,0 +1,94 @@
+'''
+NumPy-only inference of a trained INVASE selector (no Keras / TensorFlow import)
+
+---------------------------------------------------
+
+The selector is three dense layers: (100, activation) -> (100, activation) -> (d, sigmoid),
+with activation relu (Syn1, Syn2) or selu (others).
+
+Export the weights with INVASE.export_selector(path), then:
+    selector = NumpySelector(path)
+    Sel_Prob = selector.output(x)
+
+The outputs match INVASE.output up to floating point rounding (computed in the exported dtype).
+'''
+#%% Necessary packages
+import numpy as np
+
+from Model_IO import write_arrays
+
+# SELU constants (same as Keras)
+SELU_ALPHA = 1.6732632423543772848170429916717
+SELU_SCALE = 1.0507009873554804934193349852946
+
+#%% Activations
+def relu(x):
+    return np.maximum(x, 0)
+
+def selu(x):
+    with np.errstate(over = 'ignore'):
+        return SELU_SCALE * np.where(x > 0, x, SELU_ALPHA * np.expm1(np.minimum(x, 0)))
+
+def sigmoid(x):
+    with np.errstate(over = 'ignore'):
+        return 1 / (1 + np.exp(-x))
+
+ACTIVATIONS = {'relu': relu, 'selu': selu}
+
+#%% Save the selector weights
+'''
+path: output file (written as given, no .npz suffix is appended)
+weights: [kernel1, bias1, kernel2, bias2, kernel3, bias3] (Keras get_weights order)
+activation: relu or selu
+'''
+def save_selector(path, weights, activation):
+
+    arrays = {}
+    for i in range(3):
+        arrays['kernel' + str(i+1)] = weights[2*i]
+        arrays['bias' + str(i+1)] = weights[2*i+1]
+
+    arrays['activation'] = np.array(activation)
+
+    write_arrays(path, arrays)
+
+#%% NumPy selector
+class NumpySelector():
+
+    '''
+    path: .npz file written by save_selector / INVASE.export_selector
+    '''
+    def __init__(self, path):
+
+        with np.load(path) as data:
+            self.kernels = [data['kernel' + str(i+1)] for i in range(3)]
+            self.biases = [data['bias' + str(i+1)] for i in range(3)]
+            self.activation = str(data['activation'])
+
+        if self.activation not in ACTIVATIONS:
+            raise ValueError('Unknown activation: ' + self.activation)
+
+        self.dtype = self.kernels[0].dtype
+        self.input_shape = self.kernels[0].shape[0]
+
+    #%% Selection probability of one batch
+    def predict(self, x):
+
+        act = ACTIVATIONS[self.activation]
+
+        h = act(np.dot(x, self.kernels[0]) + self.biases[0])
+        h = act(np.dot(h, self.kernels[1]) + self.biases[1])
+
+        return sigmoid(np.dot(h, self.kernels[2]) + self.biases[2])
+
+    #%% Selected Features (same as INVASE.output)
+    def output(self, x_train, batch_size=10000):
+
+        n = x_train.shape[0]
+        gen_prob = np.zeros([n, self.kernels[2].shape[1]], dtype = self.dtype)
+
+        for start in range(0, n, batch_size):
+            stop = min(start + batch_size, n)
+            gen_prob[start:stop] = self.predict(np.asarray(x_train[start:stop], dtype = self.dtype))
+
+        return gen_prob
@@ -0,0 +1,86 @@
+'''
+Per-phase timing of the INVASE training loop
+
+---------------------------------------------------
+
+Phases (classic / shared step modes):
+- batch: batch sampling
+- sample: selector forward pass and mask sampling
+- predictor: predictor step (predict + train_on_batch, or the shared critic step)
+- baseline: baseline step
+- selector: selector step
+The fused step mode has a single 'step' phase besides 'batch'.
+
+Usage:
+    stats = TrainingStats(batch_size, jsonl_path = 'train_stats.jsonl')
+    t = time.perf_counter()
+    ...
+    t = stats.lap('batch', t)
+    ...
+    stats.end_iteration(epoch, d_loss, v_loss, g_loss)
+    stats.summary()
+'''
+#%% Necessary packages
+import json
+import time
+
+#%% Training statistics
+class TrainingStats():
+
+    '''
+    batch_size: number of samples per iteration
+    jsonl_path: file where a JSON record is appended every log_every iterations (None: no sink)
+    log_every: number of iterations between two records
+    '''
+    def __init__(self, batch_size, jsonl_path=None, log_every=100):
+
+        self.batch_size = batch_size
+        self.log_every = log_every
+
+        # Total wall time per phase (seconds)
+        self.phase_time = {}
+
+        self.n_iterations = 0
+        self.start_time = time.perf_counter()
+
+        self.sink = open(jsonl_path, 'a') if jsonl_path is not None else None
+
+    #%% Add the time since t0 to a phase, and return the current time (start of the next phase)
+    def lap(self, phase, t0):
+
+        now = time.perf_counter()
+        self.phase_time[phase] = self.phase_time.get(phase, 0.) + (now - t0)
+
+        return now
+
+    #%% End of an iteration (losses are the outputs of the training step)
+    def end_iteration(self, epoch, d_loss, v_loss, g_loss):
+
+        self.n_iterations += 1
+
+        if self.sink is not None and epoch % self.log_every == 0:
+            record = self.summary()
+            record.update({'epoch': epoch, 'd_loss': float(d_loss[0]), 'd_acc': float(d_loss[1]),
+                           'v_loss': float(v_loss[0]), 'v_acc': float(v_loss[1]), 'g_loss': float(g_loss)})
+
+            self.sink.write(json.dumps(record) + '\n')
+            self.sink.flush()
+
+    #%% Summary: total and mean time per phase, iterations/sec and samples/sec
+    def summary(self):
+
+        elapsed = time.perf_counter() - self.start_time
+        n = max(self.n_iterations, 1)
+
+        return {'iterations': self.n_iterations,
+                'elapsed_sec': elapsed,
+                'iterations_per_sec': self.n_iterations / elapsed,
+                'samples_per_sec': self.n_iterations * self.batch_size / elapsed,
+                'phase_sec': dict(self.phase_time),
+                'phase_ms_per_iteration': {phase: 1000 * t / n for phase, t in self.phase_time.items()}}
+
+    def close(self):
+
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
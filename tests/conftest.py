@@ -0,0 +1,7 @@
+'''
+The modules of this repository are scripts at its root (no package), so the tests import them from there.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
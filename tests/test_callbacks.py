@@ -0,0 +1,33 @@
+'''
+EarlyStopping needs the validation metrics of on_eval, so it must not be accepted without validation_data.
+'''
+import pytest
+
+from Callbacks import Callback, CallbackList, EarlyStopping
+
+def test_early_stopping_requires_validation():
+
+    with pytest.raises(ValueError):
+        CallbackList([Callback(), EarlyStopping()], has_validation = False)
+
+    CallbackList([EarlyStopping()], has_validation = True)
+    CallbackList([Callback()], has_validation = False)
+
+class Model():
+    stop_training = False
+
+def test_early_stopping_stops_on_plateau():
+
+    model = Model()
+    callback = EarlyStopping(patience = 2, min_epochs = 0)
+    callback.on_train_begin(model)
+
+    for epoch in range(4):
+        callback.on_iteration_end(model, epoch, {'g_loss': 1.0})
+        callback.on_eval(model, epoch, {'d_acc': 0.9, 'sel_rate': 0.2})
+
+        if model.stop_training:
+            break
+
+    assert model.stop_training
+    assert callback.stopped_epoch == 2
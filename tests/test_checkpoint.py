@@ -0,0 +1,44 @@
+'''
+Background checkpoint writer: a snapshot is reported by written() only once its file is complete,
+and a write error does not replace the exception of a failed training.
+'''
+import os
+
+import numpy as np
+import pytest
+
+from Checkpoint import AsyncCheckpointer
+
+def test_written_after_the_file_is_complete(tmp_path):
+
+    path = os.path.join(str(tmp_path), 'checkpoint.npz')
+    checkpointer = AsyncCheckpointer(path)
+
+    for epoch in range(3):
+        checkpointer.submit({'values': np.full(10**6, epoch)}, epoch)
+
+        # Every reported snapshot is readable
+        for tag in checkpointer.written():
+            with np.load(path) as data:
+                assert data['values'][0] >= tag
+
+    checkpointer.close()
+
+    with np.load(path) as data:
+        assert data['values'][0] == 2
+
+def test_close_keeps_the_training_exception(tmp_path):
+
+    checkpointer = AsyncCheckpointer(os.path.join(str(tmp_path), 'missing', 'checkpoint.npz'))
+    checkpointer.submit({'values': np.zeros(3)}, 0)
+
+    # Training failed: the write error is not raised
+    checkpointer.close(raise_error = False)
+    assert checkpointer.error is not None
+    assert checkpointer.written() == []
+
+    checkpointer = AsyncCheckpointer(os.path.join(str(tmp_path), 'missing', 'checkpoint.npz'))
+    checkpointer.submit({'values': np.zeros(3)}, 0)
+
+    with pytest.raises(OSError):
+        checkpointer.close()
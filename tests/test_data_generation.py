@@ -0,0 +1,41 @@
+'''
+Random-access generation: any row range must be bit-identical to the same rows of a larger range.
+'''
+import numpy as np
+import pytest
+
+from Data_Generation import ROW_BLOCK, generate_data_range
+
+N = 3 * ROW_BLOCK + 100
+
+@pytest.mark.parametrize('data_type', ['Syn1', 'Syn5'])
+@pytest.mark.parametrize('out', ['Y', 'Prob'])
+def test_range_matches_slices_of_full_range(data_type, out):
+
+    full = generate_data_range(0, N, data_type = data_type, seed = 3, out = out)
+
+    # Inside a block, ending / starting on a boundary, and spanning one or several boundaries
+    ranges = [(10, 20), (0, ROW_BLOCK), (ROW_BLOCK, ROW_BLOCK + 1), (ROW_BLOCK - 5, ROW_BLOCK + 5),
+              (ROW_BLOCK - 1, 3 * ROW_BLOCK + 1), (2 * ROW_BLOCK + 7, N)]
+
+    for start, stop in ranges:
+        part = generate_data_range(start, stop, data_type = data_type, seed = 3, out = out)
+
+        for a, b in zip(part, full):
+            np.testing.assert_array_equal(a, b[start:stop])
+
+def test_range_ground_truth_forms_and_seeds():
+
+    X, _, dense = generate_data_range(ROW_BLOCK - 50, ROW_BLOCK + 50, data_type = 'Syn4', seed = 1)
+    _, _, packed = generate_data_range(ROW_BLOCK - 50, ROW_BLOCK + 50, data_type = 'Syn4', seed = 1, ground_truth = 'packed')
+
+    np.testing.assert_array_equal(np.unpackbits(packed, axis = 1)[:, :X.shape[1]], dense)
+
+    # Another seed gives other rows
+    X_other, _, _ = generate_data_range(ROW_BLOCK - 50, ROW_BLOCK + 50, data_type = 'Syn4', seed = 2)
+    assert not np.array_equal(X, X_other)
+
+def test_invalid_range():
+
+    with pytest.raises(ValueError):
+        generate_data_range(10, 10)
@@ -0,0 +1,37 @@
+'''
+Importing the INVASE modules must not import Keras, TensorFlow or scikit-learn
+(they are loaded on the first model construction, see load_backend), and must stay fast.
+'''
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds (importing NumPy dominates; Keras / TensorFlow take several seconds)
+MAX_IMPORT_SEC = 2.0
+
+# Fresh interpreter: imports the module and reports the time and the heavy modules loaded
+SCRIPT = '''
+import importlib.util, json, sys, time
+t = time.perf_counter()
+spec = importlib.util.spec_from_file_location(sys.argv[1].replace('-', '_'), sys.argv[2])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed = time.perf_counter() - t
+print(json.dumps({'sec': elapsed, 'loaded': [m for m in ['keras', 'tensorflow', 'sklearn'] if m in sys.modules]}))
+'''
+
+@pytest.mark.parametrize('name', ['INVASE', 'INVASE-'])
+def test_import_is_lazy_and_fast(name):
+
+    out = subprocess.run([sys.executable, '-c', SCRIPT, name, os.path.join(ROOT, name + '.py')],
+                         cwd = ROOT, check = True, stdout = subprocess.PIPE, universal_newlines = True).stdout
+
+    result = json.loads(out.strip().splitlines()[-1])
+
+    assert result['loaded'] == []
+    assert result['sec'] < MAX_IMPORT_SEC
@@ -0,0 +1,46 @@
+'''
+The training iterations of INVASE must not add nodes to the backend graph or grow the memory
+(the masking is part of the predictor model, not a new layer per iteration).
+'''
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('tensorflow')
+pytest.importorskip('keras')
+
+import tensorflow as tf
+
+from INVASE import INVASE
+from Data_Generation import generate_data
+
+#%% Resident set size of the process (bytes)
+def rss():
+
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/statm'), reason='needs /proc (Linux)')
+def test_classic_step_graph_and_rss_flat():
+
+    x_train, y_train, _ = generate_data(n=2000, data_type='Syn1', seed=0, out='Y', dtype=np.float32)
+
+    model = INVASE(x_train, 'Syn1', n_epoch=1, is_logging_enabled=False)
+
+    idx = np.random.RandomState(0).randint(0, x_train.shape[0], model.batch_size)
+    x_batch, y_batch = x_train[idx], y_train[idx]
+
+    # Warm up (Keras builds its predict / train functions on the first calls)
+    for _ in range(20):
+        model.classic_step(x_batch, y_batch)
+
+    n_ops = len(tf.get_default_graph().get_operations())
+    rss_start = rss()
+
+    for _ in range(300):
+        model.classic_step(x_batch, y_batch)
+
+    assert len(tf.get_default_graph().get_operations()) == n_ops
+    # Allow for allocator noise, a leak of one layer per iteration is far larger
+    assert rss() - rss_start < 50 * 1024**2
@@ -0,0 +1,96 @@
+'''
+A training run interrupted by a checkpoint and resumed must match the uninterrupted run
+(weights, selection masks and scheduled learning rates), also when the resumed model is built with the default seed = None.
+'''
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('tensorflow')
+pytest.importorskip('keras')
+
+from keras import backend as K
+
+from INVASE import INVASE
+from Callbacks import Callback
+from Data_Generation import generate_data
+
+# Iterations before the interruption (the full run is twice as long)
+N = 5
+
+#%% Stops the training after a given iteration
+class StopAt(Callback):
+
+    def __init__(self, epoch):
+        self.epoch = epoch
+
+    def on_iteration_end(self, model, epoch, logs):
+        if epoch == self.epoch:
+            model.stop_training = True
+
+#%% Multiplicative decay (depends on the learning rate reached, not only on the iteration)
+def decay(epoch, lr):
+    return lr * 0.9
+
+@pytest.mark.parametrize('step_mode', ['classic', 'fused'])
+@pytest.mark.parametrize('lr_schedule', [None, decay])
+def test_resume_matches_uninterrupted_run(tmp_path, step_mode, lr_schedule):
+
+    x_train, y_train, _ = generate_data(n=2000, data_type='Syn1', seed=0, out='Y', dtype=np.float32)
+
+    # Common initial weights
+    init_path = os.path.join(str(tmp_path), 'init.npz')
+    INVASE(x_train, 'Syn1', n_epoch=2*N, is_logging_enabled=False, step_mode=step_mode).save(init_path)
+
+    # 1. Uninterrupted run
+    reference = INVASE.load(init_path, lr_schedule=lr_schedule)
+    np.random.seed(0)
+    reference.train(x_train, y_train)
+
+    # 2. Interrupted after N iterations (checkpoint at the last one)
+    checkpoint_path = os.path.join(str(tmp_path), 'checkpoint.npz')
+    interrupted = INVASE.load(init_path, lr_schedule=lr_schedule)
+    np.random.seed(0)
+    interrupted.train(x_train, y_train, callbacks=[StopAt(N-1)], checkpoint_path=checkpoint_path, checkpoint_every=N)
+
+    # 3. Resumed in a new model (random seed and weights, replaced by the checkpoint)
+    np.random.seed(123)
+    resumed = INVASE(x_train, 'Syn1', n_epoch=2*N, is_logging_enabled=False, step_mode=step_mode, lr_schedule=lr_schedule)
+    resumed.train(x_train, y_train, resume_from=checkpoint_path)
+
+    assert resumed.seed == reference.seed
+    assert resumed.current_learning_rates == reference.current_learning_rates
+
+    for name, optimizer in reference.optimizers.items():
+        assert K.get_value(resumed.optimizers[name].lr) == K.get_value(optimizer.lr)
+
+    for name, model in reference.networks().items():
+        for w_ref, w_resumed in zip(model.get_weights(), resumed.networks()[name].get_weights()):
+            np.testing.assert_allclose(w_resumed, w_ref, rtol=1e-5, atol=1e-6)
+
+    # Same masks at a given iteration
+    x_batch = x_train[:100]
+    np.testing.assert_array_equal(resumed.sampler([x_batch, 2*N])[1], reference.sampler([x_batch, 2*N])[1])
+
+    # An explicit different seed cannot be resumed
+    with pytest.raises(ValueError):
+        INVASE(x_train, 'Syn1', n_epoch=2*N, is_logging_enabled=False, step_mode=step_mode, seed=reference.seed + 1).train(
+            x_train, y_train, resume_from=checkpoint_path)
+
+def test_save_load_keeps_scheduled_learning_rates(tmp_path):
+
+    x_train, y_train, _ = generate_data(n=2000, data_type='Syn1', seed=0, out='Y', dtype=np.float32)
+
+    model = INVASE(x_train, 'Syn1', n_epoch=N, is_logging_enabled=False, lr_schedule={'selector': decay})
+    model.train(x_train, y_train)
+
+    path = os.path.join(str(tmp_path), 'model.npz')
+    model.save(path)
+    loaded = INVASE.load(path)
+
+    assert loaded.current_learning_rates == model.current_learning_rates
+    assert loaded.current_learning_rates['selector'] < loaded.current_learning_rates['predictor']
+
+    for name, optimizer in model.optimizers.items():
+        assert K.get_value(loaded.optimizers[name].lr) == K.get_value(optimizer.lr)
@@ -0,0 +1,67 @@
+'''
+The shared and fused step modes must optimize the same losses as the classic mode
+(same weights, batch and mask sampling iteration).
+'''
+import numpy as np
+import pytest
+
+pytest.importorskip('tensorflow')
+pytest.importorskip('keras')
+
+from INVASE import INVASE
+from Data_Generation import generate_data
+
+SEED = 7
+
+#%% Models of the given step modes with the same weights and mask seed
+def build_models(step_modes):
+
+    x_train, y_train, _ = generate_data(n=2000, data_type='Syn3', seed=0, out='Y', dtype=np.float32)
+
+    models = [INVASE(x_train, 'Syn3', n_epoch=1, is_logging_enabled=False, step_mode=step_mode, seed=SEED) for step_mode in step_modes]
+
+    for model in models[1:]:
+        for name, network in model.networks().items():
+            network.set_weights(models[0].networks()[name].get_weights())
+
+    return models, x_train[:1000], y_train[:1000]
+
+def test_fused_step_losses_match_classic_and_shared():
+
+    (classic, shared, fused), x_batch, y_batch = build_models(['classic', 'shared', 'fused'])
+
+    d_classic, v_classic, g_classic = classic.classic_step(x_batch, y_batch)
+    d_shared, v_shared, g_shared = shared.shared_step(x_batch, y_batch)
+    d_fused, v_fused, g_fused = fused.fused_step(x_batch, y_batch)
+
+    # Critic losses and accuracies: same as train_on_batch
+    np.testing.assert_allclose(d_fused, d_classic, rtol=1e-5)
+    np.testing.assert_allclose(v_fused, v_classic, rtol=1e-5)
+
+    # Selector loss: the critic outputs come from the training forward pass (as in the shared mode),
+    # so it is compared with the shared mode (classic uses the batch norm moving averages)
+    np.testing.assert_allclose(d_fused, d_shared, rtol=1e-5)
+    np.testing.assert_allclose(v_fused, v_shared, rtol=1e-5)
+    np.testing.assert_allclose(g_fused, g_shared, rtol=1e-5)
+
+def test_shared_critic_step_matches_train_on_batch():
+
+    (classic, shared), x_batch, y_batch = build_models(['classic', 'shared'])
+
+    _, sel_mask = classic.sampler([x_batch, 0])
+
+    # Predictor: loss, accuracy and updated weights
+    d_loss = classic.predictor.train_on_batch([x_batch, sel_mask], y_batch)
+    d_out = shared.predictor_step([x_batch, sel_mask, y_batch, 1])
+
+    np.testing.assert_allclose(d_out[0:2], d_loss, rtol=1e-5)
+
+    # Baseline
+    v_loss = classic.baseline.train_on_batch(x_batch, y_batch)
+    v_out = shared.baseline_step([x_batch, y_batch, 1])
+
+    np.testing.assert_allclose(v_out[0:2], v_loss, rtol=1e-5)
+
+    for name in ['predictor', 'baseline']:
+        for w_classic, w_shared in zip(classic.networks()[name].get_weights(), shared.networks()[name].get_weights()):
+            np.testing.assert_allclose(w_shared, w_classic, rtol=1e-5, atol=1e-6)
@@ -0,0 +1,74 @@
+'''
+The vectorized metrics must give the outputs of the original per-row loops of the INVASE scripts.
+'''
+import numpy as np
+import pytest
+
+from Performance_Metrics import performance_metric
+
+#%% Original per-row TPR / FDR (dense ground truth)
+def performance_metric_loop(score, g_truth):
+
+    n = len(score)
+    Temp_TPR = np.zeros([n,])
+    Temp_FDR = np.zeros([n,])
+
+    for i in range(n):
+
+        TPR_Nom = np.sum(score[i,:] * g_truth[i,:])
+        TPR_Den = np.sum(g_truth[i,:])
+        Temp_TPR[i] = 100 * float(TPR_Nom)/float(TPR_Den+1e-8)
+
+        FDR_Nom = np.sum(score[i,:] * (1-g_truth[i,:]))
+        FDR_Den = np.sum(score[i,:])
+        Temp_FDR[i] = 100 * float(FDR_Nom)/float(FDR_Den+1e-8)
+
+    return np.mean(Temp_TPR), np.mean(Temp_FDR), np.std(Temp_TPR), np.std(Temp_FDR)
+
+@pytest.mark.parametrize('d', [11, 16])
+@pytest.mark.parametrize('form', ['dense', 'bool', 'uint8', 'packed'])
+def test_performance_metric_matches_loop(d, form):
+
+    rng = np.random.RandomState(d)
+    n = 1000
+
+    score = 1. * (rng.rand(n, d) > 0.6)
+    g_truth = 1. * (rng.rand(n, d) > 0.7)
+
+    # Rows without selected / relevant features
+    score[:10] = 0
+    g_truth[5:15] = 0
+
+    g_form = {'dense': g_truth, 'bool': g_truth != 0, 'uint8': g_truth.astype(np.uint8),
+              'packed': np.packbits(g_truth != 0, axis = 1)}[form]
+
+    expected = performance_metric_loop(score, g_truth)
+
+    # Several chunks (smaller than n, not dividing it)
+    np.testing.assert_allclose(performance_metric(score, g_form, chunk_size = 64), expected, rtol = 1e-12)
+
+#%% Batched AUROC / AUPRC / accuracy against sklearn
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_batched_prediction_metrics_match_sklearn(seed):
+
+    metrics = pytest.importorskip('sklearn.metrics')
+
+    from Performance_Metrics import batched_prediction_metrics
+
+    rng = np.random.RandomState(seed)
+    s, n = 5, 500
+
+    y_true = 1. * (rng.rand(s, n) > 0.4)
+
+    # Rounded scores (many ties), with exact 0.5 values for the accuracy threshold
+    y_score = np.round(np.clip(0.3 * y_true + 0.7 * rng.rand(s, n), 0, 1), 2)
+    y_score[:, :20] = 0.5
+
+    result = batched_prediction_metrics(y_true, y_score)
+
+    for i in range(s):
+        expected = [metrics.roc_auc_score(y_true[i], y_score[i]),
+                    metrics.average_precision_score(y_true[i], y_score[i]),
+                    metrics.accuracy_score(y_true[i], 1. * (y_score[i] > 0.5))]
+
+        np.testing.assert_allclose(result[i], expected, rtol = 1e-12, atol = 1e-12)